@@ -0,0 +1,33 @@
+"""task stage for multi-stage pipelines
+
+Revision ID: 0f5d3b8e7a24
+Revises: 6e0a8c4b2f59
+Create Date: 2026-10-18 14:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0f5d3b8e7a24'
+down_revision: Union[str, None] = '6e0a8c4b2f59'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Все существующие задачи на первом этапе любого pipeline — download
+    op.add_column('tasks', sa.Column('stage', sa.String(), server_default='download', nullable=False))
+    op.drop_index('ix_tasks_queue_user', table_name='tasks')
+    op.create_index('ix_tasks_queue_user', 'tasks', ['status', 'stage', 'user_id', 'priority', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_queue_user', table_name='tasks')
+    op.create_index('ix_tasks_queue_user', 'tasks', ['status', 'action', 'user_id', 'priority', 'id'], unique=False)
+    op.drop_column('tasks', 'stage')
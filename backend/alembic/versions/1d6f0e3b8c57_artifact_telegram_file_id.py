@@ -0,0 +1,28 @@
+"""artifact telegram file_id
+
+Revision ID: 1d6f0e3b8c57
+Revises: e81a4b7c6d25
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d6f0e3b8c57'
+down_revision: Union[str, None] = 'e81a4b7c6d25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('artifacts', sa.Column('telegram_file_id', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('artifacts', 'telegram_file_id')
@@ -0,0 +1,39 @@
+"""artifact parts for files above the Telegram upload limit
+
+Revision ID: 3b7f9d2c5e86
+Revises: 8c4e2a6f1b37
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7f9d2c5e86'
+down_revision: Union[str, None] = '8c4e2a6f1b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'artifact_parts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('artifact_id', sa.Integer(), nullable=False),
+        sa.Column('part_index', sa.Integer(), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('telegram_file_id', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['artifact_id'], ['artifacts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('artifact_id', 'part_index', name='uq_artifact_parts_artifact_id_part_index'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('artifact_parts')
@@ -0,0 +1,48 @@
+"""initial schema
+
+Revision ID: 4f1c2a9d7e10
+Revises: 
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f1c2a9d7e10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('telegram_id', sa.String(), nullable=False),
+        sa.Column('status', sa.Enum('pending', 'approved', 'rejected', name='userstatus'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('telegram_id'),
+    )
+    op.create_table(
+        'tasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('video_url', sa.String(), nullable=False),
+        sa.Column('status', sa.Enum('queued', 'downloading', 'processing', 'uploading', 'completed', 'failed', name='taskstatus'), nullable=False),
+        sa.Column('action', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('tasks')
+    op.drop_table('users')
+    sa.Enum(name='taskstatus').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='userstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,30 @@
+"""task delivered_at
+
+Revision ID: 5a9c3f2e7b18
+Revises: 1d6f0e3b8c57
+Create Date: 2026-10-18 12:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a9c3f2e7b18'
+down_revision: Union[str, None] = '1d6f0e3b8c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True))
+    # Старые завершённые задачи считаем доставленными, иначе бот разошлёт их все заново
+    op.execute("UPDATE tasks SET delivered_at = now() WHERE status IN ('completed', 'failed')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tasks', 'delivered_at')
@@ -0,0 +1,30 @@
+"""delivery claims and delivery attempts
+
+Revision ID: 5d2f8b1a6c93
+Revises: 2c8e5a1f9d36
+Create Date: 2026-10-18 14:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f8b1a6c93'
+down_revision: Union[str, None] = '2c8e5a1f9d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('delivery_claimed_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('tasks', sa.Column('delivery_attempts', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tasks', 'delivery_attempts')
+    op.drop_column('tasks', 'delivery_claimed_at')
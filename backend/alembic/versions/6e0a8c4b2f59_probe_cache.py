@@ -0,0 +1,40 @@
+"""probe cache and chosen format on tasks
+
+Revision ID: 6e0a8c4b2f59
+Revises: 3b7f9d2c5e86
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e0a8c4b2f59'
+down_revision: Union[str, None] = '3b7f9d2c5e86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'probe_cache',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('info', sa.JSON(), nullable=False),
+        sa.Column('fetched_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.add_column('tasks', sa.Column('format_id', sa.String(), nullable=True))
+    op.add_column('tasks', sa.Column('expected_size_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('tasks', sa.Column('height', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tasks', 'height')
+    op.drop_column('tasks', 'expected_size_bytes')
+    op.drop_column('tasks', 'format_id')
+    op.drop_table('probe_cache')
@@ -0,0 +1,49 @@
+"""task status events
+
+Revision ID: 7e2b9d4a0c61
+Revises: 5a9c3f2e7b18
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2b9d4a0c61'
+down_revision: Union[str, None] = '5a9c3f2e7b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Любая смена статуса (из backend, воркера, у ведомых задач) уходит в NOTIFY,
+    # поэтому событиям не нужно дублироваться в коде каждого сервиса
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_task_event() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' OR NEW.status IS DISTINCT FROM OLD.status THEN
+                PERFORM pg_notify('vidmore_task_events', json_build_object(
+                    'task_id', NEW.id,
+                    'status', NEW.status,
+                    'action', NEW.action,
+                    'telegram_id', (SELECT telegram_id FROM users WHERE id = NEW.user_id)
+                )::text);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER tasks_status_event
+        AFTER INSERT OR UPDATE OF status ON tasks
+        FOR EACH ROW EXECUTE FUNCTION notify_task_event()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS tasks_status_event ON tasks")
+    op.execute("DROP FUNCTION IF EXISTS notify_task_event()")
@@ -0,0 +1,37 @@
+"""task retries and dead_letter status
+
+Revision ID: 8c4e2a6f1b37
+Revises: d5b1f7a3c940
+Create Date: 2026-10-18 13:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2a6f1b37'
+down_revision: Union[str, None] = 'd5b1f7a3c940'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Новое значение enum нельзя использовать в той же транзакции, где оно добавлено
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE taskstatus ADD VALUE IF NOT EXISTS 'dead_letter'")
+    op.add_column('tasks', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('tasks', sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('tasks', sa.Column('last_error', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tasks', 'last_error')
+    op.drop_column('tasks', 'next_attempt_at')
+    op.drop_column('tasks', 'attempts')
+    # Из enum в Postgres значение не удалить; dead_letter-задачи считаем просто failed
+    op.execute("UPDATE tasks SET status = 'failed' WHERE status = 'dead_letter'")
@@ -0,0 +1,30 @@
+"""task leases
+
+Revision ID: 9b3e6d0c2a41
+Revises: 4f1c2a9d7e10
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e6d0c2a41'
+down_revision: Union[str, None] = '4f1c2a9d7e10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('worker_id', sa.String(), nullable=True))
+    op.add_column('tasks', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tasks', 'lease_expires_at')
+    op.drop_column('tasks', 'worker_id')
@@ -0,0 +1,30 @@
+"""task priority and fair-share queue index
+
+Revision ID: a6c2e9f4d813
+Revises: f3a7c1d9e024
+Create Date: 2026-10-18 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c2e9f4d813'
+down_revision: Union[str, None] = 'f3a7c1d9e024'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('priority', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_tasks_queue_user', 'tasks', ['status', 'action', 'user_id', 'priority', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_queue_user', table_name='tasks')
+    op.drop_column('tasks', 'priority')
@@ -0,0 +1,33 @@
+"""task listing indexes and created_at
+
+Revision ID: b4d8e1f6a372
+Revises: 7e2b9d4a0c61
+Create Date: 2026-10-18 13:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d8e1f6a372'
+down_revision: Union[str, None] = '7e2b9d4a0c61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # У старых задач created_at будет временем миграции — точнее взять неоткуда
+    op.add_column('tasks', sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.create_index('ix_tasks_status_action_id', 'tasks', ['status', 'action', 'id'], unique=False)
+    op.create_index('ix_tasks_user_id_id', 'tasks', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_user_id_id', table_name='tasks')
+    op.drop_index('ix_tasks_status_action_id', table_name='tasks')
+    op.drop_column('tasks', 'created_at')
@@ -0,0 +1,46 @@
+"""artifact cache
+
+Revision ID: c27d5e8f1a93
+Revises: 9b3e6d0c2a41
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c27d5e8f1a93'
+down_revision: Union[str, None] = '9b3e6d0c2a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'artifacts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('cache_key', sa.String(), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_accessed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('cache_key'),
+    )
+    op.add_column('tasks', sa.Column('cache_key', sa.String(), nullable=True))
+    op.add_column('tasks', sa.Column('artifact_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_tasks_cache_key'), 'tasks', ['cache_key'], unique=False)
+    op.create_foreign_key('tasks_artifact_id_fkey', 'tasks', 'artifacts', ['artifact_id'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('tasks_artifact_id_fkey', 'tasks', type_='foreignkey')
+    op.drop_index(op.f('ix_tasks_cache_key'), table_name='tasks')
+    op.drop_column('tasks', 'artifact_id')
+    op.drop_column('tasks', 'cache_key')
+    op.drop_table('artifacts')
@@ -0,0 +1,32 @@
+"""single-flight leader task
+
+Revision ID: e81a4b7c6d25
+Revises: c27d5e8f1a93
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e81a4b7c6d25'
+down_revision: Union[str, None] = 'c27d5e8f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('leader_task_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_tasks_leader_task_id'), 'tasks', ['leader_task_id'], unique=False)
+    op.create_foreign_key('tasks_leader_task_id_fkey', 'tasks', 'tasks', ['leader_task_id'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('tasks_leader_task_id_fkey', 'tasks', type_='foreignkey')
+    op.drop_index(op.f('ix_tasks_leader_task_id'), table_name='tasks')
+    op.drop_column('tasks', 'leader_task_id')
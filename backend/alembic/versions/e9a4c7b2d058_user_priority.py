@@ -0,0 +1,28 @@
+"""per-user task priority assigned by admins
+
+Revision ID: e9a4c7b2d058
+Revises: 5d2f8b1a6c93
+Create Date: 2026-10-18 14:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9a4c7b2d058'
+down_revision: Union[str, None] = '5d2f8b1a6c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('priority', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'priority')
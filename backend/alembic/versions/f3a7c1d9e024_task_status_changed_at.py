@@ -0,0 +1,47 @@
+"""task status_changed_at
+
+Revision ID: f3a7c1d9e024
+Revises: b4d8e1f6a372
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a7c1d9e024'
+down_revision: Union[str, None] = 'b4d8e1f6a372'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('status_changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True))
+    # Статус меняют и backend, и воркеры, и массовые UPDATE ведомых задач —
+    # проще всего отмечать время смены в самой базе
+    op.execute("""
+        CREATE OR REPLACE FUNCTION touch_task_status_changed_at() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' OR NEW.status IS DISTINCT FROM OLD.status THEN
+                NEW.status_changed_at := now();
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER tasks_status_changed_at
+        BEFORE INSERT OR UPDATE OF status ON tasks
+        FOR EACH ROW EXECUTE FUNCTION touch_task_status_changed_at()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS tasks_status_changed_at ON tasks")
+    op.execute("DROP FUNCTION IF EXISTS touch_task_status_changed_at()")
+    op.drop_column('tasks', 'status_changed_at')
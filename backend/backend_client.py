@@ -0,0 +1,111 @@
+# backend_client.py
+#
+# Долгоживущий клиент к backend API: один пул keep-alive соединений на весь
+# процесс бота вместо нового aiohttp.ClientSession на каждый запрос. Один
+# модуль на оба бота: bot/bot.py импортирует его как backend.backend_client.
+
+import asyncio
+import json
+import random
+import time
+
+import aiohttp
+
+# На эти ответы GET-запросы повторяются с backoff
+RETRY_STATUSES = (502, 503, 504)
+
+
+class BackendClient:
+    def __init__(self, base_url, pool_size=100, timeout=15, retries=3, backoff=0.3, stream_read_timeout=60,
+                 on_request=None):
+        self.base_url = base_url.rstrip("/")
+        # on_request(method, path, status, seconds) вызывается после каждого запроса (метрики);
+        # status — HTTP-код или "error", если ответа не было
+        self.on_request = on_request
+        self.stream_read_timeout = stream_read_timeout
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+
+    async def start(self):
+        """Создаёт сессию; вызывать внутри работающего event loop."""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout, connect=5),
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _sleep(self, attempt):
+        delay = self.backoff * (2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, delay))
+
+    async def request(self, method, path, **kwargs):
+        """Выполняет запрос и возвращает (HTTP-статус, JSON-тело).
+
+        GET повторяется при сетевых ошибках, таймаутах и 502/503/504.
+        Остальные методы повторяются только если соединение не удалось
+        установить — тогда запрос точно не дошёл до backend и дубля не будет.
+        """
+        await self.start()
+        started = time.perf_counter()
+        status = "error"
+        try:
+            status, body = await self._request(method, path, **kwargs)
+            return status, body
+        finally:
+            if self.on_request is not None:
+                self.on_request(method, path, status, time.perf_counter() - started)
+
+    async def _request(self, method, path, **kwargs):
+        url = f"{self.base_url}{path}"
+        idempotent = method == "GET"
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                async with self._session.request(method, url, **kwargs) as resp:
+                    if idempotent and resp.status in RETRY_STATUSES and not last_attempt:
+                        await self._sleep(attempt)
+                        continue
+                    return resp.status, await resp.json(content_type=None)
+            except aiohttp.ClientConnectorError:
+                if last_attempt:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if not idempotent or last_attempt:
+                    raise
+            await self._sleep(attempt)
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def events(self, path, **kwargs):
+        """Читает SSE-поток и отдаёт JSON из каждой строки data:.
+
+        Общий таймаут запроса здесь не действует — поток живёт, пока его не
+        закроют; backend шлёт пинги, поэтому обрыв ловится по sock_read.
+        """
+        await self.start()
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=self.stream_read_timeout)
+        async with self._session.get(f"{self.base_url}{path}", timeout=timeout, **kwargs) as resp:
+            resp.raise_for_status()
+            async for line in resp.content:
+                line = line.decode().strip()
+                if line.startswith("data:"):
+                    yield json.loads(line[5:])
@@ -1,5 +1,4 @@
 import os
-import aiohttp
 import asyncio
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
@@ -11,43 +10,51 @@ from aiogram.types import (
 )
 from aiogram.enums import ParseMode
 from dotenv import load_dotenv
+from backend_client import BackendClient
+from aiogram.fsm.storage.memory import MemoryStorage
+from fsm_storage import PostgresStorage
 
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000/api")
 ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").replace(",", " ").split() if x]
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "100"))
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "15"))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", "3"))
+# Этот бот работает только через polling (один процесс); webhook и реплики — у bot/bot.py.
+# FSM_STORAGE=postgres — состояние диалогов в таблице fsm_states, переживает перезапуск
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+DATABASE_URL = os.getenv("DATABASE_URL")
 
 bot = Bot(token=BOT_TOKEN, default=types.DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher()
+dp = Dispatcher(storage=PostgresStorage(DATABASE_URL) if FSM_STORAGE == "postgres" else MemoryStorage())
+# Один пул соединений к backend на весь процесс; открывается в main()
+backend = BackendClient(BACKEND_URL, pool_size=BACKEND_POOL_SIZE, timeout=BACKEND_TIMEOUT, retries=BACKEND_RETRIES)
 
 # FSM States
 class AddTask(StatesGroup):
     waiting_for_video_url = State()
 
 async def api_get_user(telegram_id):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{BACKEND_URL}/users/{telegram_id}") as resp:
-            if resp.status == 404:
-                return None
-            return await resp.json()
+    status, data = await backend.get(f"/users/{telegram_id}")
+    if status == 404:
+        return None
+    return data
 
 async def api_register_user(telegram_id):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{BACKEND_URL}/users/register", params={"telegram_id": telegram_id}) as resp:
-            return await resp.json()
+    _, data = await backend.post("/users/register", params={"telegram_id": telegram_id})
+    return data
 
 async def api_create_task(telegram_id, video_url):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{BACKEND_URL}/tasks/create", params={
-            "telegram_id": telegram_id,
-            "video_url": video_url
-        }) as resp:
-            return await resp.json()
+    _, data = await backend.post("/tasks/create", params={
+        "telegram_id": telegram_id,
+        "video_url": video_url
+    })
+    return data
 
 async def api_get_tasks(telegram_id):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{BACKEND_URL}/tasks/{telegram_id}") as resp:
-            return await resp.json()
+    _, data = await backend.get(f"/tasks/{telegram_id}")
+    return data
 
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
@@ -128,6 +135,11 @@ async def get_video_url(message: types.Message, state: FSMContext):
         await message.answer("Похоже, это не ссылка. Пожалуйста, попробуйте снова.")
         return
     result = await api_create_task(telegram_id, video_url)
+    if "retry_after" in result:
+        # Backend отклонил по лимиту на пользователя (429)
+        await message.answer(f"⏳ Лимит задач исчерпан, попробуйте снова через {result['retry_after']} с.")
+        await state.clear()
+        return
     await message.answer(
         f"Задача добавлена!\nID: <b>{result.get('task_id')}</b>\nСтатус: <b>{result.get('status')}</b>",
         parse_mode="HTML",
@@ -148,7 +160,11 @@ async def show_my_tasks(message: types.Message):
     await message.answer(text, parse_mode="HTML")
 
 async def main():
-    await dp.start_polling(bot)
+    await backend.start()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await backend.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
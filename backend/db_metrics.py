@@ -0,0 +1,57 @@
+# backend/db_metrics.py
+#
+# Метрики, общие для API и воркеров: запросы к БД и время, проведённое
+# задачами в каждом статусе. Без импортов моделей, чтобы воркер мог брать
+# модуль как backend.db_metrics.
+
+import time
+from datetime import datetime, timezone
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+
+DB_QUERY_LATENCY = Histogram(
+    "vidmore_db_query_duration_seconds",
+    "Время выполнения SQL-запроса (количество — _count)",
+    ["operation"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+DB_QUERY_ERRORS = Counter("vidmore_db_query_errors_total", "SQL-запросы, завершившиеся ошибкой")
+TASK_STATUS_DURATION = Histogram(
+    "vidmore_task_status_duration_seconds",
+    "Сколько задача пробыла в статусе до смены",
+    ["status"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+def instrument_engine(engine):
+    """Считает время и количество SQL-запросов через события SQLAlchemy."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_LATENCY.labels(operation).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        DB_QUERY_ERRORS.inc()
+
+
+def observe_status_change(task, new_status):
+    """Отмечает, сколько задача провела в текущем статусе перед сменой на new_status."""
+    changed_at = task.status_changed_at
+    if task.status == new_status or changed_at is None:
+        return
+    if changed_at.tzinfo is None:
+        # SQLite отдаёт время без зоны
+        changed_at = changed_at.replace(tzinfo=timezone.utc)
+    TASK_STATUS_DURATION.labels(task.status.value).observe((datetime.now(timezone.utc) - changed_at).total_seconds())
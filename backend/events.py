@@ -0,0 +1,80 @@
+# backend/events.py
+#
+# Поток событий о смене статусов задач. Postgres-триггер на tasks шлёт NOTIFY
+# в TASK_EVENTS_CHANNEL (см. миграцию task_status_events), а TaskEventHub
+# держит одно LISTEN-соединение через asyncpg и раздаёт события подписчикам
+# SSE-эндпоинта /api/events/tasks.
+
+import asyncio
+import json
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from notifications import TASK_EVENTS_CHANNEL
+
+# Сколько событий держим для медленного подписчика, дальше — отбрасываем
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class TaskEventHub:
+    def __init__(self, database_url, channel=TASK_EVENTS_CHANNEL):
+        url = make_url(database_url)
+        self.enabled = url.get_backend_name() == "postgresql"
+        self.dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self._conn = None
+        self._subscribers = set()
+        self._reconnect_task = None
+
+    async def start(self):
+        if not self.enabled:
+            return
+        try:
+            self._conn = await asyncpg.connect(self.dsn)
+            await self._conn.add_listener(self.channel, self._on_notify)
+            self._conn.add_termination_listener(self._on_terminated)
+        except (OSError, asyncpg.PostgresError) as e:
+            print(f"Task events: LISTEN failed, retrying: {e}")
+            self._conn = None
+            self._schedule_reconnect()
+
+    async def stop(self):
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    @property
+    def connected(self):
+        return self._conn is not None and not self._conn.is_closed()
+
+    def _on_terminated(self, conn):
+        print("Task events: LISTEN connection lost")
+        self._conn = None
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        await asyncio.sleep(5)
+        await self.start()
+
+    def _on_notify(self, conn, pid, channel, payload):
+        event = json.loads(payload)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass  # подписчик не успевает — он доберёт пропуски опросом
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
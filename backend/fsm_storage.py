@@ -0,0 +1,77 @@
+# fsm_storage.py
+#
+# FSM-хранилище aiogram в Postgres (таблица fsm_states, см. миграцию
+# fsm_states): состояние диалогов общее для всех реплик бота и переживает
+# перезапуск. Один модуль на оба бота: bot/bot.py импортирует его как
+# backend.fsm_storage.
+
+import json
+import re
+
+import asyncpg
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+
+def asyncpg_dsn(database_url):
+    # DATABASE_URL backend'а в формате SQLAlchemy: postgresql+psycopg2://...
+    return re.sub(r"^postgresql\+\w+://", "postgresql://", database_url)
+
+
+class PostgresStorage(BaseStorage):
+    """FSM-хранилище aiogram поверх таблицы fsm_states; общее для всех реплик бота."""
+
+    def __init__(self, database_url, pool_size=10):
+        self.dsn = asyncpg_dsn(database_url)
+        self.pool_size = pool_size
+        self._pool = None
+
+    async def _get_pool(self):
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+        return self._pool
+
+    @staticmethod
+    def make_key(key):
+        parts = [key.bot_id, key.chat_id, key.user_id]
+        if key.thread_id:
+            parts.append(key.thread_id)
+        if key.business_connection_id:
+            parts.append(key.business_connection_id)
+        parts.append(key.destiny)
+        return ":".join(str(part) for part in parts)
+
+    async def set_state(self, key, state=None):
+        value = state.state if isinstance(state, State) else state
+        pool = await self._get_pool()
+        await pool.execute(
+            """
+            INSERT INTO fsm_states (key, state) VALUES ($1, $2)
+            ON CONFLICT (key) DO UPDATE SET state = EXCLUDED.state, updated_at = now()
+            """,
+            self.make_key(key), value,
+        )
+
+    async def get_state(self, key):
+        pool = await self._get_pool()
+        return await pool.fetchval("SELECT state FROM fsm_states WHERE key = $1", self.make_key(key))
+
+    async def set_data(self, key, data):
+        pool = await self._get_pool()
+        await pool.execute(
+            """
+            INSERT INTO fsm_states (key, data) VALUES ($1, $2::json)
+            ON CONFLICT (key) DO UPDATE SET data = EXCLUDED.data, updated_at = now()
+            """,
+            self.make_key(key), json.dumps(data),
+        )
+
+    async def get_data(self, key):
+        pool = await self._get_pool()
+        data = await pool.fetchval("SELECT data FROM fsm_states WHERE key = $1", self.make_key(key))
+        return json.loads(data) if data else {}
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
@@ -0,0 +1,142 @@
+# backend/limits.py
+#
+# Ограничения на создание задач для каждого пользователя:
+#  - token bucket на частоту запросов (RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST);
+#  - не больше USER_MAX_ACTIVE_TASKS незавершённых задач одновременно;
+#  - не больше USER_MAX_BYTES скачанных байт за USER_BYTES_WINDOW_HOURS.
+# Bucket-ы живут в памяти процесса или, при нескольких репликах backend,
+# в таблице rate_limit_buckets (RATE_LIMIT_STORE=postgres).
+# Отказ — 429 с заголовком Retry-After.
+
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from models import Artifact, RateLimitBucket, Task, TaskStatus
+
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "10"))
+USER_MAX_ACTIVE_TASKS = int(os.getenv("USER_MAX_ACTIVE_TASKS", "20"))
+USER_MAX_BYTES = int(os.getenv("USER_MAX_BYTES", str(20 * 1024 ** 3)))
+USER_BYTES_WINDOW_HOURS = float(os.getenv("USER_BYTES_WINDOW_HOURS", "24"))
+# Через сколько предлагать повторить, если упёрлись в число активных задач
+ACTIVE_TASKS_RETRY_AFTER = int(os.getenv("ACTIVE_TASKS_RETRY_AFTER", "60"))
+
+UNFINISHED_STATUSES = (TaskStatus.queued, TaskStatus.downloading, TaskStatus.processing, TaskStatus.uploading)
+# Сверх этого числа bucket-ов в памяти полные (давно не тронутые) выбрасываются
+MEMORY_STORE_MAX_KEYS = 10000
+
+
+class LimitExceeded(HTTPException):
+    """429 с Retry-After; limit — какое ограничение сработало (rate / active_tasks / bytes)."""
+
+    def __init__(self, limit, detail, retry_after):
+        self.limit = limit
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(status_code=429, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+
+class MemoryRateLimitStore:
+    """Bucket-ы в памяти процесса: быстро, но у каждой реплики свои."""
+
+    def __init__(self):
+        self._buckets = {}
+
+    async def take(self, db, key, rate, burst, cost=1):
+        """Списывает cost токенов. Возвращает 0 или сколько секунд ждать."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < cost:
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / rate
+        self._buckets[key] = (tokens - cost, now)
+        if len(self._buckets) > MEMORY_STORE_MAX_KEYS:
+            self._prune(now, rate, burst)
+        return 0
+
+    def _prune(self, now, rate, burst):
+        full_after = burst / rate
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated >= full_after:
+                del self._buckets[key]
+
+
+class PostgresRateLimitStore:
+    """Bucket-ы в таблице rate_limit_buckets, общие для всех реплик backend.
+
+    Пополнение и списание — один INSERT ... ON CONFLICT DO UPDATE, поэтому
+    параллельные запросы одного пользователя не спишут токены дважды.
+    Списание фиксируется вместе с транзакцией запроса.
+    """
+
+    async def take(self, db, key, rate, burst, cost=1):
+        refilled = func.least(
+            burst,
+            RateLimitBucket.tokens + func.extract("epoch", func.now() - RateLimitBucket.updated_at) * rate,
+        )
+        stmt = insert(RateLimitBucket).values(key=key, tokens=burst - cost, updated_at=func.now())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={"tokens": refilled - cost, "updated_at": func.now()},
+            where=refilled >= cost,
+        ).returning(RateLimitBucket.tokens)
+        if (await db.execute(stmt)).first() is not None:
+            return 0
+        tokens = await db.scalar(select(refilled).where(RateLimitBucket.key == key))
+        return (cost - (tokens or 0)) / rate
+
+
+def make_store(name=RATE_LIMIT_STORE):
+    stores = {"memory": MemoryRateLimitStore, "postgres": PostgresRateLimitStore}
+    if name not in stores:
+        raise ValueError(f"Unknown RATE_LIMIT_STORE: {name}")
+    return stores[name]()
+
+
+rate_limit_store = make_store()
+
+
+async def check_rate_limit(db, telegram_id):
+    """Token bucket на создание задач; вызывается до любых запросов к tasks."""
+    if RATE_LIMIT_PER_MINUTE <= 0:
+        return
+    wait = await rate_limit_store.take(db, f"tasks:{telegram_id}", RATE_LIMIT_PER_MINUTE / 60, RATE_LIMIT_BURST)
+    if wait:
+        raise LimitExceeded("rate", "Too many requests", wait)
+
+
+async def check_quotas(db, user, new_tasks=1):
+    """Квоты пользователя: число незавершённых задач и объём скачанного за окно."""
+    if USER_MAX_ACTIVE_TASKS > 0:
+        active = await db.scalar(
+            select(func.count(Task.id)).where(Task.user_id == user.id, Task.status.in_(UNFINISHED_STATUSES))
+        )
+        if active + new_tasks > USER_MAX_ACTIVE_TASKS:
+            raise LimitExceeded(
+                "active_tasks",
+                f"Too many unfinished tasks: {active} of {USER_MAX_ACTIVE_TASKS}",
+                ACTIVE_TASKS_RETRY_AFTER,
+            )
+    if USER_MAX_BYTES > 0:
+        since = datetime.now(timezone.utc) - timedelta(hours=USER_BYTES_WINDOW_HOURS)
+        used, oldest = (await db.execute(
+            select(func.coalesce(func.sum(Artifact.size_bytes), 0), func.min(Task.created_at))
+            .join(Artifact, Task.artifact_id == Artifact.id)
+            .where(Task.user_id == user.id, Task.created_at >= since)
+        )).one()
+        if used >= USER_MAX_BYTES:
+            # Квота освободится, когда самая старая задача выйдет из окна
+            if oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=timezone.utc)
+            raise LimitExceeded(
+                "bytes",
+                f"Download quota exceeded: {used} of {USER_MAX_BYTES} bytes in {USER_BYTES_WINDOW_HOURS:g}h",
+                (oldest - since).total_seconds(),
+            )
@@ -0,0 +1,56 @@
+# backend/links.py
+#
+# Распознавание платформы и канонического id видео по ссылке.
+# Шаблоны платформ те же, что в bot.is_supported_link.
+
+import re
+import hashlib
+
+PLATFORM_PATTERNS = {
+    "youtube": r'(https?://)?(www\.)?(youtube\.com|youtu\.be)/',
+    "vk": r'(https?://)?(www\.)?vk\.com/video',
+    "rutube": r'(https?://)?(www\.)?rutube\.ru/video',
+    "dzen": r'(https?://)?(www\.)?dzen\.ru/video',
+}
+
+
+def detect_platform(url: str):
+    """Возвращает имя платформы (youtube / vk / rutube / dzen) или None."""
+    for platform, pattern in PLATFORM_PATTERNS.items():
+        if re.search(pattern, url):
+            return platform
+    return None
+
+
+# Где в ссылке лежит id видео на каждой платформе
+VIDEO_ID_PATTERNS = {
+    "youtube": [
+        r'youtu\.be/([\w-]{11})',
+        r'youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)([\w-]{11})',
+    ],
+    "vk": [r'vk\.com/video(?:\?z=video)?(-?\d+_\d+)', r'[?&]z=video(-?\d+_\d+)'],
+    "rutube": [r'rutube\.ru/video/(?:private/)?([0-9a-f]{32})'],
+    "dzen": [r'dzen\.ru/video/watch/([\w-]+)'],
+}
+
+
+def canonical_id(url: str):
+    """Канонический id видео вида 'youtube:dQw4w9WgXcQ'.
+
+    Разные ссылки на одно видео (youtu.be, watch?v=, shorts, лишние
+    параметры) дают один и тот же id. Если id вытащить не удалось,
+    используется хеш самой ссылки — тогда совпадут только одинаковые ссылки.
+    """
+    url = url.strip()
+    platform = detect_platform(url)
+    for pattern in VIDEO_ID_PATTERNS.get(platform, []):
+        match = re.search(pattern, url)
+        if match:
+            return f"{platform}:{match.group(1)}"
+    normalized = re.sub(r'^https?://(www\.)?', '', url).rstrip('/')
+    return "url:" + hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def cache_key(url: str, profile: str = "mp4"):
+    """Ключ кэша готовых файлов: канонический id + профиль формата."""
+    return f"{canonical_id(url)}:{profile}"
@@ -1,8 +1,27 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, Request
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from db import SessionLocal
-from models import User, UserStatus, Task, TaskStatus
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from prometheus_client import start_http_server
+from pydantic import BaseModel, Field
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+import os
+import io
+import csv
+import json
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+from db import AsyncSessionLocal, DATABASE_URL, async_engine
+from models import User, UserStatus, Task, TaskStatus, Artifact, ArtifactPart
+from notifications import notify, TASKS_CHANNEL
+from links import cache_key
+from pipelines import PIPELINES, RESULT_PROFILES, first_stage
+from events import TaskEventHub
+from limits import LimitExceeded, check_quotas, check_rate_limit
+from metrics import REQUEST_LATENCY, track_queue_depth
+from db_metrics import instrument_engine, observe_status_change
 
 app = FastAPI(
     title="Vidmore API",
@@ -11,95 +30,610 @@ app = FastAPI(
     servers=[{"url": "/api"}]
 )
 
+# Через сколько секунд незавершённая отправка результата считается потерянной
+# и доставку может забрать снова; сколько раз пытаться, прежде чем сдаться
+DELIVERY_CLAIM_SECONDS = int(os.getenv("DELIVERY_CLAIM_SECONDS", "600"))
+MAX_DELIVERY_ATTEMPTS = int(os.getenv("MAX_DELIVERY_ATTEMPTS", "5"))
+DELIVERABLE_STATUSES = [TaskStatus.completed, TaskStatus.failed, TaskStatus.dead_letter]
+
+# Метрики отдаются отдельным HTTP-сервером на этом порту, как у воркера и бота:
+# порт не публикуется наружу и не проксируется nginx
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# События смены статусов задач для бота (SSE), см. events.py
+task_events = TaskEventHub(DATABASE_URL)
+
+# Время и количество SQL-запросов API, см. db_metrics.py
+instrument_engine(async_engine.sync_engine)
+queue_depth_task = None
+
+@app.on_event("startup")
+async def start_task_events():
+    global queue_depth_task
+    start_http_server(METRICS_PORT)
+    await task_events.start()
+    queue_depth_task = asyncio.create_task(track_queue_depth(AsyncSessionLocal))
+
+@app.on_event("shutdown")
+async def stop_task_events():
+    if queue_depth_task:
+        queue_depth_task.cancel()
+    await task_events.stop()
+
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Шаблон роута, а не сам путь — иначе по метке на каждый telegram_id
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
+    content = {"detail": exc.detail}
+    if isinstance(exc, LimitExceeded):
+        content["limit"] = exc.limit
+        content["retry_after"] = exc.retry_after
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail},
+        content=content,
+        headers=exc.headers,
     )
 
-def get_db():
-    db = SessionLocal()
-    try:
+# Задача с этими статусами ещё может стать лидером для такого же видео
+ACTIVE_TASK_STATUSES = (TaskStatus.queued, TaskStatus.downloading, TaskStatus.processing, TaskStatus.uploading)
+
+async def find_cached_artifacts(db, keys):
+    """Готовые файлы по ключам кэша: {cache_key: Artifact}, только если файл на месте."""
+    if not keys:
+        return {}
+    artifacts = (await db.scalars(
+        select(Artifact).where(Artifact.cache_key.in_(keys)).options(selectinload(Artifact.parts))
+    )).all()
+    # У нарезанного на части артефакта path — папка с частями
+    return {a.cache_key: a for a in artifacts if os.path.exists(a.path)}
+
+async def find_inflight_leaders(db, keys):
+    """Задачи, которые уже качают эти видео: {cache_key: Task} (самая ранняя на ключ)."""
+    if not keys:
+        return {}
+    leaders = {}
+    tasks = (await db.scalars(
+        select(Task)
+        .where(Task.cache_key.in_(keys), Task.leader_task_id.is_(None), Task.status.in_(ACTIVE_TASK_STATUSES))
+        .order_by(Task.id)
+    )).all()
+    for task in tasks:
+        leaders.setdefault(task.cache_key, task)
+    return leaders
+
+async def create_tasks(db, user, video_urls, action):
+    """Создаёт задачи пользователя одной транзакцией.
+
+    Кэш и задачи в работе ищутся одним запросом на всю пачку, вставка идёт
+    пачками через flush. Видео из кэша сразу completed, уже качающиеся —
+    ведомые к лидеру (в том числе к лидеру из этой же пачки). Возвращает
+    список (task, artifact) в порядке video_urls; commit делает вызывающий.
+    Приоритет задач — user.priority, его назначает администратор; лидер
+    получает приоритет не ниже, чем у его ведомых.
+    """
+    priority = user.priority or 0
+    if action not in PIPELINES:
+        raise HTTPException(status_code=400, detail="Unknown action")
+    keys = [cache_key(url, RESULT_PROFILES[action]) for url in video_urls]
+    wanted = {k for k in keys if k}
+    artifacts = await find_cached_artifacts(db, wanted)
+    leaders = await find_inflight_leaders(db, wanted - set(artifacts))
+
+    created, first_pass, followers = [], [], []
+    batch_keys = set()
+    for url, key in zip(video_urls, keys):
+        task = Task(
+            user_id=user.id, video_url=url, action=action, stage=first_stage(action), cache_key=key,
+            status=TaskStatus.queued, priority=priority,
+        )
+        artifact = artifacts.get(key)
+        if artifact:
+            # Это видео уже скачано — задача готова сразу, файл общий
+            task.status = TaskStatus.completed
+            task.artifact = artifact
+            artifact.last_accessed_at = func.now()
+            first_pass.append(task)
+        elif key and (key in leaders or key in batch_keys):
+            # То же видео уже в работе — ждём результат лидера, воркер не нужен
+            followers.append(task)
+        else:
+            if key:
+                batch_keys.add(key)
+            first_pass.append(task)
+        created.append(task)
+
+    db.add_all(first_pass)
+    await db.flush()
+    for task in first_pass:
+        if task.cache_key and task.status == TaskStatus.queued:
+            leaders.setdefault(task.cache_key, task)
+    for task in followers:
+        leader = leaders[task.cache_key]
+        task.leader_task_id = leader.id
+        task.status = leader.status
+        if leader.priority < priority:
+            leader.priority = priority
+    if followers:
+        db.add_all(followers)
+        await db.flush()
+
+    queued = [t.id for t in first_pass if t.status == TaskStatus.queued]
+    if queued:
+        # Будим воркеры сразу, а не через период опроса
+        await notify(db, TASKS_CHANNEL, {"task_ids": queued, "action": action})
+    return [(t, artifacts.get(t.cache_key) if t.artifact_id else None) for t in created]
+
+def artifact_parts_info(artifact):
+    """Части файла для бота; пустой список — файл отправляется целиком. parts должны быть загружены."""
+    return [
+        {"part_id": p.id, "file_path": p.path, "telegram_file_id": p.telegram_file_id}
+        for p in artifact.parts
+    ]
+
+def task_created_info(task, artifact):
+    result = {"task_id": task.id, "status": task.status.value}
+    if artifact:
+        result["artifact_id"] = artifact.id
+        result["file_path"] = artifact.path
+        result["telegram_file_id"] = artifact.telegram_file_id
+        result["parts"] = artifact_parts_info(artifact)
+    if task.leader_task_id:
+        result["leader_task_id"] = task.leader_task_id
+    return result
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def get_user_by_telegram_id(db, telegram_id):
+    return await db.scalar(select(User).where(User.telegram_id == telegram_id))
 
 @app.post("/api/users/register")
-def register_user(telegram_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter_by(telegram_id=telegram_id).first()
+async def register_user(telegram_id: str, db: AsyncSession = Depends(get_db)):
+    user = await get_user_by_telegram_id(db, telegram_id)
     if user:
         return {"msg": "already_registered", "status": user.status.value}
-    user = User(telegram_id=telegram_id)
+    user = User(telegram_id=telegram_id, status=UserStatus.pending)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     return {"msg": "registered", "status": user.status.value}
 
 @app.get("/api/users/{telegram_id}")
-def get_user(telegram_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter_by(telegram_id=telegram_id).first()
+async def get_user(telegram_id: str, db: AsyncSession = Depends(get_db)):
+    user = await get_user_by_telegram_id(db, telegram_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {"telegram_id": user.telegram_id, "status": user.status.value}
 
+@app.post("/api/users/update_priority")
+async def update_user_priority(
+    telegram_id: str = Query(...),
+    priority: int = Query(..., ge=-10, le=10),
+    db: AsyncSession = Depends(get_db)
+):
+    """Приоритет новых задач пользователя (тариф). Уже созданные задачи не меняются."""
+    user = await get_user_by_telegram_id(db, telegram_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.priority = priority
+    await db.commit()
+    return {"msg": "priority_updated", "telegram_id": user.telegram_id, "priority": user.priority}
+
 @app.post("/api/users/update_status")
-def update_user_status(
+async def update_user_status(
     telegram_id: str = Query(...),
     status: str = Query(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter_by(telegram_id=telegram_id).first()
+    user = await get_user_by_telegram_id(db, telegram_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if status not in ["pending", "approved", "rejected"]:
         raise HTTPException(status_code=400, detail="Invalid status")
     user.status = UserStatus(status)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     return {"msg": "status_updated", "telegram_id": user.telegram_id, "status": user.status.value}
 
 @app.post("/api/tasks/create")
-def create_task(
+async def create_task(
     telegram_id: str,
     video_url: str,
     action: str = "download",  # <--- добавили параметр
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter_by(telegram_id=telegram_id).first()
+    await check_rate_limit(db, telegram_id)
+    user = await get_user_by_telegram_id(db, telegram_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    await check_quotas(db, user)
+    [(task, artifact)] = await create_tasks(db, user, [video_url], action)
+    await db.commit()
+    return {"msg": "task_created", **task_created_info(task, artifact)}
+
+class TaskBatchCreate(BaseModel):
+    telegram_id: str
+    video_urls: list[str] = Field(..., min_length=1, max_length=100)
+    action: str = "download"
+
+@app.post("/api/tasks/create_batch")
+async def create_tasks_batch(batch: TaskBatchCreate, db: AsyncSession = Depends(get_db)):
+    """Много ссылок одного пользователя (плейлист, сообщение с несколькими ссылками) за один запрос."""
+    await check_rate_limit(db, batch.telegram_id)
+    user = await get_user_by_telegram_id(db, batch.telegram_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    task = Task(user_id=user.id, video_url=video_url, action=action)
-    db.add(task)
-    db.commit()
-    db.refresh(task)
-    return {"msg": "task_created", "task_id": task.id, "status": task.status.value}
+    await check_quotas(db, user, len(batch.video_urls))
+    created = await create_tasks(db, user, batch.video_urls, batch.action)
+    await db.commit()
+    return {
+        "msg": "tasks_created",
+        "tasks": [{"video_url": t.video_url, **task_created_info(t, a)} for t, a in created],
+    }
+
+def filter_tasks(query, status=None, action=None, created_from=None, created_to=None):
+    """Общие фильтры списков задач; неизвестный статус — 400."""
+    if status is not None:
+        if status not in [s.value for s in TaskStatus]:
+            raise HTTPException(status_code=400, detail="Invalid status")
+        query = query.where(Task.status == TaskStatus(status))
+    if action is not None:
+        query = query.where(Task.action == action)
+    if created_from is not None:
+        query = query.where(Task.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Task.created_at < created_to)
+    return query
+
+def set_next_cursor(response, rows, limit):
+    # Курсор — id последней строки страницы; тело ответа остаётся списком
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
 
 @app.get("/api/tasks/{telegram_id}")
-def get_tasks(telegram_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter_by(telegram_id=telegram_id).first()
+async def get_tasks(
+    telegram_id: str,
+    response: Response,
+    limit: int = Query(20, ge=1, le=200),
+    cursor: int = Query(None, description="id последней задачи с предыдущей страницы"),
+    status: str = None,
+    action: str = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Задачи пользователя, новые первыми. Следующая страница — cursor из X-Next-Cursor."""
+    user = await get_user_by_telegram_id(db, telegram_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    tasks = db.query(Task).filter_by(user_id=user.id).all()
-    return [{"task_id": t.id, "video_url": t.video_url, "status": t.status.value} for t in tasks]
+    query = select(
+        Task.id, Task.video_url, Task.status, Task.artifact_id, Task.leader_task_id, Task.created_at,
+        Task.attempts, Task.last_error, Task.format_id, Task.expected_size_bytes, Task.height,
+    ).where(Task.user_id == user.id)
+    query = filter_tasks(query, status, action, created_from, created_to)
+    if cursor is not None:
+        query = query.where(Task.id < cursor)
+    tasks = (await db.execute(query.order_by(Task.id.desc()).limit(limit))).all()
+    set_next_cursor(response, tasks, limit)
+    # Сколько задач ждут результата каждой из задач пользователя
+    followers = dict((await db.execute(
+        select(Task.leader_task_id, func.count(Task.id))
+        .where(Task.leader_task_id.in_([t.id for t in tasks]))
+        .group_by(Task.leader_task_id)
+    )).all()) if tasks else {}
+    return [
+        {
+            "task_id": t.id,
+            "video_url": t.video_url,
+            "status": t.status.value,
+            "artifact_id": t.artifact_id,
+            "leader_task_id": t.leader_task_id,
+            "followers": followers.get(t.id, 0),
+            "attempts": t.attempts,
+            "last_error": t.last_error,
+            "format_id": t.format_id,
+            "expected_size_bytes": t.expected_size_bytes,
+            "height": t.height,
+            "created_at": t.created_at,
+        }
+        for t in tasks
+    ]
 
 @app.get("/api/tasks/")
-def get_all_tasks(db: Session = Depends(get_db)):
-    tasks = db.query(Task).all()
-    return [{"task_id": t.id, "user_id": t.user_id, "video_url": t.video_url, "status": t.status.value} for t in tasks]
+async def get_all_tasks(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: int = Query(None, description="id последней задачи с предыдущей страницы"),
+    status: str = None,
+    action: str = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Все задачи по возрастанию id. Следующая страница — cursor из X-Next-Cursor."""
+    query = select(Task.id, Task.user_id, Task.video_url, Task.status, Task.action, Task.created_at)
+    query = filter_tasks(query, status, action, created_from, created_to)
+    if cursor is not None:
+        query = query.where(Task.id > cursor)
+    tasks = (await db.execute(query.order_by(Task.id).limit(limit))).all()
+    set_next_cursor(response, tasks, limit)
+    return [
+        {
+            "task_id": t.id,
+            "user_id": t.user_id,
+            "video_url": t.video_url,
+            "status": t.status.value,
+            "action": t.action,
+            "created_at": t.created_at,
+        }
+        for t in tasks
+    ]
+
+# Колонки выгрузки задач для аналитики
+EXPORT_COLUMNS = ["task_id", "user_id", "telegram_id", "video_url", "action", "status", "cache_key", "artifact_id", "created_at", "delivered_at"]
+EXPORT_BATCH_SIZE = 1000
+
+async def export_rows(query, fmt):
+    """Построчно отдаёт задачи; в памяти не больше одной пачки из EXPORT_BATCH_SIZE строк."""
+    async with AsyncSessionLocal() as db:
+        if fmt == "csv":
+            yield ",".join(EXPORT_COLUMNS) + "\n"
+        rows = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for row in rows:
+            record = {
+                "task_id": row.id,
+                "user_id": row.user_id,
+                "telegram_id": row.telegram_id,
+                "video_url": row.video_url,
+                "action": row.action,
+                "status": row.status.value,
+                "cache_key": row.cache_key,
+                "artifact_id": row.artifact_id,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "delivered_at": row.delivered_at.isoformat() if row.delivered_at else None,
+            }
+            if fmt == "csv":
+                buf = io.StringIO()
+                csv.writer(buf).writerow(record[c] for c in EXPORT_COLUMNS)
+                yield buf.getvalue()
+            else:
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+
+@app.get("/api/export/tasks")
+async def export_tasks(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: str = None,
+    action: str = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+):
+    """Потоковая выгрузка всей истории задач в NDJSON или CSV.
+
+    Строки читаются серверным курсором (yield_per), поэтому память не растёт
+    с размером таблицы. Сессия своя, а не из get_db: она должна жить, пока
+    отдаётся ответ.
+    """
+    query = (
+        select(
+            Task.id, Task.user_id, User.telegram_id, Task.video_url, Task.action, Task.status,
+            Task.cache_key, Task.artifact_id, Task.created_at, Task.delivered_at,
+        )
+        .outerjoin(User, Task.user_id == User.id)
+        .order_by(Task.id)
+    )
+    query = filter_tasks(query, status, action, created_from, created_to)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_rows(query, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=tasks.{format}"},
+    )
 
 @app.post("/api/tasks/update_status")
-def update_task_status(task_id: int, status: str, db: Session = Depends(get_db)):
-    task = db.query(Task).filter_by(id=task_id).first()
+async def update_task_status(task_id: int, status: str, db: AsyncSession = Depends(get_db)):
+    task = await db.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     if status not in [s.value for s in TaskStatus]:
         raise HTTPException(status_code=400, detail="Invalid status")
+    observe_status_change(task, TaskStatus(status))
     task.status = TaskStatus(status)
-    db.commit()
-    db.refresh(task)
+    # Ведомые задачи живут по статусу лидера
+    await db.execute(
+        update(Task)
+        .where(Task.leader_task_id == task.id)
+        .values(status=task.status)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
     return {"msg": "task_status_updated", "task_id": task.id, "status": task.status.value}
 
+@app.post("/api/artifacts/update_file_id")
+async def update_artifact_file_id(artifact_id: int, file_id: str, db: AsyncSession = Depends(get_db)):
+    artifact = await db.get(Artifact, artifact_id)
+    if not artifact:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    artifact.telegram_file_id = file_id
+    await db.commit()
+    return {"msg": "file_id_updated", "artifact_id": artifact.id}
+
+@app.post("/api/artifacts/update_part_file_id")
+async def update_artifact_part_file_id(part_id: int, file_id: str, db: AsyncSession = Depends(get_db)):
+    part = await db.get(ArtifactPart, part_id)
+    if not part:
+        raise HTTPException(status_code=404, detail="Artifact part not found")
+    part.telegram_file_id = file_id
+    await db.commit()
+    return {"msg": "file_id_updated", "part_id": part.id}
+
+@app.post("/api/deliveries/claim")
+async def claim_deliveries(
+    task_id: List[int] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+):
+    """Забирает готовые задачи на отправку пользователю и возвращает их.
+
+    Задачу получает только один вызов: повторно её можно забрать, лишь когда
+    заявка старше DELIVERY_CLAIM_SECONDS (отправка оборвалась). task_id —
+    забрать только эти задачи (бот отправляет видео из кэша сразу).
+    """
+    expired = datetime.now(timezone.utc) - timedelta(seconds=DELIVERY_CLAIM_SECONDS)
+    unclaimed = or_(Task.delivery_claimed_at.is_(None), Task.delivery_claimed_at < expired)
+    # Отправка, оборвавшаяся на последней попытке, так и не позвала /fail — закрываем здесь
+    await db.execute(
+        update(Task)
+        .where(
+            Task.delivered_at.is_(None), Task.delivery_claimed_at < expired,
+            Task.delivery_attempts >= MAX_DELIVERY_ATTEMPTS,
+        )
+        .values(delivered_at=func.now(), last_error="Delivery failed: no confirmation from the bot")
+    )
+    claimable = (
+        select(Task.id)
+        .where(
+            Task.status.in_(DELIVERABLE_STATUSES), Task.delivered_at.is_(None), unclaimed,
+            Task.delivery_attempts < MAX_DELIVERY_ATTEMPTS,
+        )
+        .order_by(Task.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    if task_id:
+        claimable = claimable.where(Task.id.in_(task_id))
+    claimed = (await db.scalars(
+        update(Task)
+        .where(Task.id.in_(claimable.scalar_subquery()))
+        .values(delivery_claimed_at=func.now(), delivery_attempts=Task.delivery_attempts + 1)
+        .returning(Task.id)
+    )).all()
+    await db.commit()
+    if not claimed:
+        return []
+    rows = (await db.execute(
+        select(Task, User.telegram_id, Artifact)
+        .join(User, Task.user_id == User.id)
+        .outerjoin(Artifact, Task.artifact_id == Artifact.id)
+        .where(Task.id.in_(claimed))
+        .options(selectinload(Artifact.parts))
+        .order_by(Task.id)
+    )).all()
+    return [
+        {
+            "task_id": t.id,
+            "telegram_id": telegram_id,
+            "video_url": t.video_url,
+            "action": t.action,
+            "status": t.status.value,
+            "artifact_id": a.id if a else None,
+            "file_path": a.path if a else None,
+            "telegram_file_id": a.telegram_file_id if a else None,
+            "parts": artifact_parts_info(a) if a else [],
+        }
+        for t, telegram_id, a in rows
+    ]
+
+@app.post("/api/deliveries/fail")
+async def fail_delivery(task_id: int, error: str = "", db: AsyncSession = Depends(get_db)):
+    """Отправка не удалась. Повтор — когда истечёт заявка; после
+    MAX_DELIVERY_ATTEMPTS попыток доставка закрывается (gave_up)."""
+    task = await db.get(Task, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    gave_up = task.delivered_at is None and task.delivery_attempts >= MAX_DELIVERY_ATTEMPTS
+    if gave_up:
+        task.delivered_at = func.now()
+        task.last_error = f"Delivery failed: {error}"[:1000]
+    await db.commit()
+    return {"msg": "delivery_failed", "task_id": task.id, "gave_up": gave_up}
+
+@app.post("/api/deliveries/confirm")
+async def confirm_delivery(task_id: int, db: AsyncSession = Depends(get_db)):
+    task = await db.get(Task, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    task.delivered_at = func.now()
+    await db.commit()
+    return {"msg": "delivery_confirmed", "task_id": task.id}
+
+@app.get("/api/events/tasks")
+async def stream_task_events(request: Request, telegram_id: str = None):
+    """SSE-поток смен статусов задач; telegram_id — только задачи одного пользователя."""
+    if not task_events.enabled:
+        raise HTTPException(status_code=503, detail="Task events are not available")
+    queue = task_events.subscribe()
+
+    async def stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if telegram_id and event.get("telegram_id") != telegram_id:
+                    continue
+                yield f"event: task\ndata: {json.dumps(event)}\n\n"
+        finally:
+            task_events.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class TaskStatusUpdate(BaseModel):
+    task_id: int
+    status: str
+
+class TaskStatusBatch(BaseModel):
+    items: list[TaskStatusUpdate] = Field(..., min_length=1, max_length=1000)
+
+@app.post("/api/tasks/update_status_batch")
+async def update_task_status_batch(batch: TaskStatusBatch, db: AsyncSession = Depends(get_db)):
+    """Смена статусов многих задач одним UPDATE по первичному ключу в одной транзакции."""
+    valid = [s.value for s in TaskStatus]
+    if any(item.status not in valid for item in batch.items):
+        raise HTTPException(status_code=400, detail="Invalid status")
+    statuses = {item.task_id: TaskStatus(item.status) for item in batch.items}
+    found = set((await db.scalars(select(Task.id).where(Task.id.in_(statuses)))).all())
+    missing = sorted(set(statuses) - found)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Tasks not found: {missing}")
+    await db.execute(update(Task), [{"id": task_id, "status": status} for task_id, status in statuses.items()])
+    # Ведомые задачи живут по статусу лидера
+    by_status = {}
+    for task_id, status in statuses.items():
+        by_status.setdefault(status, []).append(task_id)
+    for status, task_ids in by_status.items():
+        await db.execute(
+            update(Task)
+            .where(Task.leader_task_id.in_(task_ids))
+            .values(status=status)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    return {
+        "msg": "task_statuses_updated",
+        "tasks": [{"task_id": task_id, "status": status.value} for task_id, status in statuses.items()],
+    }
+
 @app.get("/api/")
-def root():
+async def root():
     return {"status": "ok"}
@@ -0,0 +1,42 @@
+# backend/metrics.py
+#
+# Метрики Prometheus для API: задержки роутов и глубина очереди по статусам.
+# Запросы к БД и время в статусах — в db_metrics.py, общем с воркерами.
+
+import asyncio
+
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import func, select
+
+from models import Task
+
+REQUEST_LATENCY = Histogram(
+    "vidmore_http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+)
+QUEUE_DEPTH = Gauge("vidmore_tasks", "Количество задач по статусу и действию", ["status", "action"])
+
+# Как часто пересчитывать глубину очереди
+QUEUE_DEPTH_INTERVAL = 15
+
+
+async def track_queue_depth(session_factory, interval=QUEUE_DEPTH_INTERVAL):
+    """Периодически обновляет QUEUE_DEPTH одним GROUP BY по tasks."""
+    reported = set()
+    while True:
+        try:
+            async with session_factory() as db:
+                rows = (await db.execute(
+                    select(Task.status, Task.action, func.count(Task.id)).group_by(Task.status, Task.action)
+                )).all()
+            current = {(status.value, action or ""): count for status, action, count in rows}
+            # Статусы, в которых задач больше нет, обнуляем
+            for labels in reported - set(current):
+                QUEUE_DEPTH.labels(*labels).set(0)
+            for labels, count in current.items():
+                QUEUE_DEPTH.labels(*labels).set(count)
+            reported |= set(current)
+        except Exception as e:
+            print(f"Queue depth update failed: {e}")
+        await asyncio.sleep(interval)
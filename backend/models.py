@@ -1,6 +1,6 @@
 # backend/models.py
 
-from sqlalchemy import Column, Integer, String, Enum, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Float, JSON, String, Enum, ForeignKey, DateTime, Index, UniqueConstraint, func
 from sqlalchemy.orm import declarative_base, relationship
 import enum
 
@@ -19,12 +19,15 @@ class TaskStatus(enum.Enum):
     uploading = "uploading"     # Загрузка на платформу
     completed = "completed"     # Всё успешно завершено
     failed = "failed"           # Ошибка при выполнении
+    dead_letter = "dead_letter" # Временные ошибки не прошли за MAX_ATTEMPTS попыток
 
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
     telegram_id = Column(String, unique=True, nullable=False)
     status = Column(Enum(UserStatus), default=UserStatus.pending, nullable=False)
+    # Приоритет задач пользователя (тариф); назначает администратор, см. /api/users/update_priority
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
     tasks = relationship("Task", back_populates="user")
 
 class Task(Base):
@@ -33,5 +36,89 @@ class Task(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     video_url = Column(String, nullable=False)
     status = Column(Enum(TaskStatus), default=TaskStatus.queued, nullable=False)
-    action = Column(String, nullable=True)  # download / upload / etc.
+    action = Column(String, nullable=True)  # download / reupload, см. pipelines.py
+    stage = Column(String, nullable=False, default="download", server_default="download")  # этап, который ждёт задача
+    worker_id = Column(String, nullable=True)  # какой воркер держит аренду задачи
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)  # когда аренда истекает
+    cache_key = Column(String, nullable=True, index=True)  # канонический id видео + формат, см. links.cache_key
+    artifact_id = Column(Integer, ForeignKey("artifacts.id"), nullable=True)  # готовый файл
+    # Если то же видео уже качает другая задача, эта ждёт её результата (single-flight)
+    leader_task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True, index=True)
+    delivered_at = Column(DateTime(timezone=True), nullable=True)  # когда бот отправил результат пользователю
+    # Доставку забирает одна отправка (см. /api/deliveries/claim); заявка истекает через DELIVERY_CLAIM_SECONDS
+    delivery_claimed_at = Column(DateTime(timezone=True), nullable=True)
+    delivery_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Когда статус менялся последний раз; в Postgres ставится триггером при любой смене статуса
+    status_changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")  # сколько раз воркеры брали задачу
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)  # раньше этого времени повтор не берём
+    last_error = Column(String, nullable=True)  # ошибка последней попытки
+    # Что выбрал probe перед скачиванием, см. download_worker/probe.py
+    format_id = Column(String, nullable=True)  # формат yt-dlp, например "137+140"
+    expected_size_bytes = Column(BigInteger, nullable=True)
+    height = Column(Integer, nullable=True)  # высота кадра выбранного формата
+    # Чем больше, тем раньше задачу возьмёт воркер; внутри одного приоритета — честная очередь по пользователям
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
     user = relationship("User", back_populates="tasks")
+    artifact = relationship("Artifact")
+
+    __table_args__ = (
+        # Очередь воркера и фильтры списка задач
+        Index("ix_tasks_status_action_id", "status", "action", "id"),
+        # Задачи пользователя с постраничной выдачей по id
+        Index("ix_tasks_user_id_id", "user_id", "id"),
+        # Разбиение очереди по пользователям в claim_task
+        Index("ix_tasks_queue_user", "status", "stage", "user_id", "priority", "id"),
+    )
+
+class Artifact(Base):
+    # Скачанный файл в /downloads, общий для всех задач с тем же cache_key
+    __tablename__ = "artifacts"
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String, unique=True, nullable=False)
+    path = Column(String, nullable=False)  # файл; у нарезанного на части — папка с частями
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_accessed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # для LRU-вытеснения
+    telegram_file_id = Column(String, nullable=True)  # file_id после первой отправки в Telegram, повторно не грузим
+    # Части файла, если он больше лимита Telegram на загрузку; пусто — отправляется целиком
+    parts = relationship(
+        "ArtifactPart", order_by="ArtifactPart.part_index", cascade="all, delete-orphan", passive_deletes=True,
+    )
+
+class ArtifactPart(Base):
+    # Кусок большого артефакта, нарезанный ffmpeg без перекодирования
+    __tablename__ = "artifact_parts"
+    id = Column(Integer, primary_key=True)
+    artifact_id = Column(Integer, ForeignKey("artifacts.id", ondelete="CASCADE"), nullable=False)
+    part_index = Column(Integer, nullable=False)
+    path = Column(String, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+    telegram_file_id = Column(String, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("artifact_id", "part_index", name="uq_artifact_parts_artifact_id_part_index"),
+    )
+
+class RateLimitBucket(Base):
+    # Token bucket общего хранилища лимитов (RATE_LIMIT_STORE=postgres), см. limits.py
+    __tablename__ = "rate_limit_buckets"
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class ProbeCache(Base):
+    # Метаданные видео из yt-dlp (extract_info без скачивания) по canonical_id, см. links.canonical_id
+    __tablename__ = "probe_cache"
+    key = Column(String, primary_key=True)
+    info = Column(JSON, nullable=False)  # длительность и список форматов без ссылок на потоки
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class FsmState(Base):
+    # Состояние диалогов бота (FSM_STORAGE=postgres), общее для всех реплик; см. fsm_storage.py
+    __tablename__ = "fsm_states"
+    key = Column(String, primary_key=True)  # bot_id:chat_id:user_id[:thread_id]:destiny
+    state = Column(String, nullable=True)
+    data = Column(JSON, nullable=False, server_default="{}")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
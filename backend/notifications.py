@@ -0,0 +1,37 @@
+# backend/notifications.py
+#
+# Postgres NOTIFY для событий по задачам. Модуль не зависит от models/db,
+# поэтому его импортирует и backend, и download_worker.
+
+import json
+from sqlalchemy import text
+
+# Канал, в который backend сообщает о новых задачах в очереди
+TASKS_CHANNEL = "vidmore_tasks"
+# Канал смены статусов задач, его наполняет триггер на таблице tasks
+TASK_EVENTS_CHANNEL = "vidmore_task_events"
+
+
+async def notify(db, channel, payload):
+    """Отправляет pg_notify в текущей транзакции (db — AsyncSession).
+
+    Слушатели получат событие только после commit, так что воркер не
+    увидит задачу раньше, чем она появится в таблице. На не-Postgres базах
+    ничего не делает.
+    """
+    if db.bind.dialect.name != "postgresql":
+        return
+    await db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": json.dumps(payload)},
+    )
+
+
+def notify_sync(session, channel, payload):
+    """То же, что notify, для синхронной Session (download_worker)."""
+    if session.bind.dialect.name != "postgresql":
+        return
+    session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": json.dumps(payload)},
+    )
@@ -0,0 +1,32 @@
+# backend/pipelines.py
+#
+# Этапы, которые проходит задача каждого action. Каждый этап забирают свои
+# воркеры (WORKER_STAGE в download_worker), задача переходит между этапами
+# через очередь: воркер этапа ставит ей следующий stage и статус queued.
+# Модуль без зависимостей, его импортирует и backend, и download_worker.
+
+PIPELINES = {
+    "download": ("download",),
+    # Перезалив: скачать исходник, затем пережать в mp4, который Telegram показывает как видео
+    "reupload": ("download", "transcode"),
+}
+
+# Профиль cache_key итогового файла action (см. links.cache_key)
+RESULT_PROFILES = {
+    "download": "mp4",
+    "reupload": "reupload",
+}
+# Профиль исходника, который download кладёт в кэш для следующего этапа. Отдельный
+# от "mp4": такой файл не нарезан на части и не должен попадать в выдачу action download
+SOURCE_PROFILE = "source"
+
+
+def first_stage(action):
+    return PIPELINES[action][0]
+
+
+def next_stage(action, stage):
+    """Этап после stage или None, если stage последний (или action неизвестен)."""
+    stages = PIPELINES.get(action, (stage,))
+    index = stages.index(stage) + 1
+    return stages[index] if index < len(stages) else None
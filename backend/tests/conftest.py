@@ -0,0 +1,32 @@
+# Тесты API на SQLite: окружение задаётся до импорта db/main, модули backend
+# импортируются без пакета, как в контейнере.
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+DB_DIR = tempfile.mkdtemp(prefix="vidmore-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(DB_DIR, 'test.db')}")
+os.environ.setdefault("METRICS_PORT", "0")
+for limit in ("RATE_LIMIT_PER_MINUTE", "USER_MAX_ACTIVE_TASKS", "USER_MAX_BYTES"):
+    os.environ.setdefault(limit, "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_engine():
+    from db import engine
+    from models import Base
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def client(db_engine):
+    from fastapi.testclient import TestClient
+    from main import app
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,50 @@
+from sqlalchemy.orm import Session
+
+from links import cache_key
+from models import Artifact, ArtifactPart, Task, User, UserStatus
+
+VIDEO_URL = "https://youtu.be/dQw4w9WgXcQ"
+
+
+def add_user(engine, telegram_id="42"):
+    with Session(engine) as session:
+        session.add(User(telegram_id=telegram_id, status=UserStatus.approved))
+        session.commit()
+
+
+def test_split_artifact_is_a_cache_hit(client, db_engine, tmp_path):
+    add_user(db_engine)
+    parts_dir = tmp_path / "7_parts"
+    parts_dir.mkdir()
+    part_paths = []
+    for i in range(2):
+        part = parts_dir / f"part{i:03d}.mp4"
+        part.write_bytes(b"x")
+        part_paths.append(str(part))
+    with Session(db_engine) as session:
+        session.add(Artifact(
+            cache_key=cache_key(VIDEO_URL), path=str(parts_dir), size_bytes=2,
+            parts=[ArtifactPart(part_index=i, path=p, size_bytes=1) for i, p in enumerate(part_paths)],
+        ))
+        session.commit()
+
+    response = client.post("/api/tasks/create", params={"telegram_id": "42", "video_url": VIDEO_URL})
+
+    assert response.status_code == 200
+    task = response.json()
+    assert task["status"] == "completed"
+    assert [p["file_path"] for p in task["parts"]] == part_paths
+
+
+def test_priority_comes_from_the_user_not_the_request(client, db_engine):
+    add_user(db_engine)
+    assert client.post("/api/users/update_priority", params={"telegram_id": "42", "priority": 3}).status_code == 200
+
+    response = client.post("/api/tasks/create", params={
+        "telegram_id": "42", "video_url": VIDEO_URL, "priority": 10,
+    })
+
+    assert response.status_code == 200
+    with Session(db_engine) as session:
+        task = session.get(Task, response.json()["task_id"])
+        assert task.priority == 3
@@ -0,0 +1,41 @@
+from sqlalchemy.orm import Session
+
+from models import Task, TaskStatus, User, UserStatus
+
+
+def add_user_with_task(engine, telegram_id="42", **task_fields):
+    with Session(engine) as session:
+        user = User(telegram_id=telegram_id, status=UserStatus.approved)
+        session.add(user)
+        session.flush()
+        task = Task(user_id=user.id, video_url="https://youtu.be/dQw4w9WgXcQ", **task_fields)
+        session.add(task)
+        session.commit()
+        return task.id
+
+
+def test_get_tasks_returns_retry_and_format_fields(client, db_engine):
+    task_id = add_user_with_task(
+        db_engine,
+        status=TaskStatus.queued, attempts=2, last_error="HTTP Error 503",
+        format_id="137+140", expected_size_bytes=1024, height=1080,
+    )
+
+    response = client.get("/api/tasks/42")
+
+    assert response.status_code == 200
+    [task] = response.json()
+    assert task["task_id"] == task_id
+    assert task["status"] == "queued"
+    assert task["attempts"] == 2
+    assert task["last_error"] == "HTTP Error 503"
+    assert task["format_id"] == "137+140"
+    assert task["expected_size_bytes"] == 1024
+    assert task["height"] == 1080
+    assert task["followers"] == 0
+
+
+def test_get_tasks_unknown_user(client):
+    response = client.get("/api/tasks/missing")
+
+    assert response.status_code == 404
@@ -1,7 +1,6 @@
 import os
-import aiohttp
+import sys
 import asyncio
-import subprocess
 import re
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
@@ -12,13 +11,52 @@ from aiogram.types import (
     InlineKeyboardMarkup, InlineKeyboardButton
 )
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
 from dotenv import load_dotenv
 
+# Добавляем корень проекта в sys.path: клиент backend и FSM-хранилище общие с backend/bot.py
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.backend_client import BackendClient
+from ttl_cache import TTLCache
+from metrics import HandlerTimingMiddleware, observe_backend_call
+from prometheus_client import start_http_server
+from aiogram.fsm.storage.memory import MemoryStorage
+from backend.fsm_storage import PostgresStorage
+from webhook import run_on_one_replica, serve_webhook
+
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000/api")
 ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").replace(",", " ").split() if x]
-DOWNLOADS_PATH = "/downloads"  # В docker-compose пробросить ./downloads:/downloads
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "100"))
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "15"))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", "3"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# При нескольких репликах одобрение/отказ сбрасывает кэш только на одной из них,
+# поэтому там кэшируются лишь одобренные пользователи и ненадолго
+USER_CACHE_SHARED_TTL = int(os.getenv("USER_CACHE_SHARED_TTL", "15"))
+# Готовые задачи приходят push-событием из backend; опрос — страховка на случай пропусков.
+# Сколько файлов отправлять одновременно
+DELIVERY_POLL_INTERVAL = float(os.getenv("DELIVERY_POLL_INTERVAL", "60"))
+DELIVERY_CONCURRENCY = int(os.getenv("DELIVERY_CONCURRENCY", "4"))
+# Порт, на котором отдаются метрики Prometheus
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+# polling — одна реплика тянет апдейты сама; webhook — Telegram шлёт их на
+# WEBHOOK_URL + WEBHOOK_PATH через nginx, реплик может быть несколько
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "https://video.mzimer.net")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# memory — состояние диалогов в процессе; postgres — в общей таблице fsm_states.
+# Webhook-режим рассчитан на несколько реплик и требует postgres
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Ключ pg advisory lock реплики, которая ведёт delivery_watcher и task_event_listener
+BACKGROUND_LOCK_ID = 7420012
 
 # Для aiogram >=3.4
 try:
@@ -26,7 +64,33 @@ try:
 except AttributeError:
     bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
 
-dp = Dispatcher()
+if BOT_MODE == "webhook" and FSM_STORAGE != "postgres":
+    # Реплики с состоянием в памяти теряли бы диалоги и рассылали бы результаты каждая
+    raise RuntimeError("BOT_MODE=webhook requires FSM_STORAGE=postgres")
+if FSM_STORAGE == "postgres" and not DATABASE_URL:
+    raise RuntimeError("FSM_STORAGE=postgres requires DATABASE_URL")
+shared_state = FSM_STORAGE == "postgres"
+dp = Dispatcher(storage=PostgresStorage(DATABASE_URL) if shared_state else MemoryStorage())
+dp.message.middleware(HandlerTimingMiddleware())
+dp.callback_query.middleware(HandlerTimingMiddleware())
+# Один пул соединений к backend на весь процесс; открывается в main()
+backend = BackendClient(
+    BACKEND_URL, pool_size=BACKEND_POOL_SIZE, timeout=BACKEND_TIMEOUT, retries=BACKEND_RETRIES,
+    on_request=observe_backend_call,
+)
+# Статусы пользователей: почти каждый хендлер проверяет "approved", не ходим за этим в backend каждый раз.
+# Сбрасывается, когда админ одобряет/отклоняет заявку через бота
+user_cache = TTLCache(
+    maxsize=USER_CACHE_SIZE, ttl=min(USER_CACHE_TTL, USER_CACHE_SHARED_TTL) if shared_state else USER_CACHE_TTL,
+)
+# Будит delivery_watcher, когда пришло событие о завершении задачи
+delivery_wakeup = asyncio.Event()
+# Сообщения пользователю при смене статуса задачи
+STATUS_MESSAGES = {
+    "downloading": "⏬ Задача <b>{task_id}</b>: скачиваю видео.",
+    "processing": "⚙️ Задача <b>{task_id}</b>: обрабатываю видео.",
+    "uploading": "📤 Задача <b>{task_id}</b>: загружаю видео.",
+}
 
 class AddTask(StatesGroup):
     waiting_for_video_url = State()
@@ -41,32 +105,95 @@ def is_supported_link(url: str):
     return any(re.search(p, url) for p in supported_patterns)
 
 async def api_get_user(telegram_id):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{BACKEND_URL}/users/{telegram_id}") as resp:
-            if resp.status == 404:
-                return None
-            return await resp.json()
+    user = user_cache.get(telegram_id)
+    if user is not None:
+        return user
+    version = user_cache.version
+    status, data = await backend.get(f"/users/{telegram_id}")
+    if status == 404:
+        return None
+    # Статус мог смениться, пока шёл запрос, — тогда ответ не кэшируем.
+    # С репликами заявка pending не кэшируется: одобрение на другой реплике сюда не дойдёт
+    if not shared_state or data.get("status") == "approved":
+        user_cache.set(telegram_id, data, version=version)
+    return data
 
 async def api_register_user(telegram_id):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{BACKEND_URL}/users/register", params={"telegram_id": telegram_id}) as resp:
-            return await resp.json()
+    _, data = await backend.post("/users/register", params={"telegram_id": telegram_id})
+    user_cache.invalidate(telegram_id)
+    return data
+
+async def api_update_user_status(telegram_id, status):
+    _, data = await backend.post("/users/update_status", params={
+        "telegram_id": telegram_id,
+        "status": status
+    })
+    # Сбрасываем после ответа: иначе параллельный api_get_user успел бы закэшировать старый статус
+    user_cache.invalidate(telegram_id)
+    return data
+
+# Ответы на 429 от backend (см. backend/limits.py)
+LIMIT_MESSAGES = {
+    "rate": "⏳ Слишком много запросов. Попробуйте снова через {retry_after} с.",
+    "active_tasks": "⏳ У вас слишком много незавершённых задач. Дождитесь их и попробуйте снова.",
+    "bytes": "⏳ Вы исчерпали лимит скачиваний. Попробуйте снова через {hours} ч.",
+}
+
+def limit_message(data):
+    """Текст для пользователя, если backend отклонил запрос по лимиту, иначе None."""
+    if not isinstance(data, dict) or "retry_after" not in data:
+        return None
+    template = LIMIT_MESSAGES.get(data.get("limit"), LIMIT_MESSAGES["rate"])
+    return template.format(retry_after=data["retry_after"], hours=max(1, round(data["retry_after"] / 3600)))
 
 async def api_create_task(telegram_id, video_url, action=None):
-    async with aiohttp.ClientSession() as session:
-        params = {
-            "telegram_id": telegram_id,
-            "video_url": video_url
-        }
-        if action:
-            params["action"] = action
-        async with session.post(f"{BACKEND_URL}/tasks/create", params=params) as resp:
-            return await resp.json()
+    params = {
+        "telegram_id": telegram_id,
+        "video_url": video_url
+    }
+    if action:
+        params["action"] = action
+    _, data = await backend.post("/tasks/create", params=params)
+    return data
+
+async def api_create_tasks_batch(telegram_id, video_urls, action="download"):
+    _, data = await backend.post("/tasks/create_batch", json={
+        "telegram_id": telegram_id,
+        "video_urls": video_urls,
+        "action": action
+    })
+    return data
+
+async def api_set_artifact_file_id(artifact_id, file_id):
+    _, data = await backend.post("/artifacts/update_file_id", params={
+        "artifact_id": artifact_id,
+        "file_id": file_id
+    })
+    return data
+
+async def api_set_part_file_id(part_id, file_id):
+    _, data = await backend.post("/artifacts/update_part_file_id", params={
+        "part_id": part_id,
+        "file_id": file_id
+    })
+    return data
+
+async def api_claim_deliveries(task_ids=None):
+    """Забирает готовые задачи на отправку; каждую задачу получает только один вызов."""
+    _, data = await backend.post("/deliveries/claim", params=[("task_id", t) for t in task_ids or ()])
+    return data if isinstance(data, list) else []
+
+async def api_fail_delivery(task_id, error):
+    _, data = await backend.post("/deliveries/fail", params={"task_id": task_id, "error": error[:500]})
+    return data
+
+async def api_confirm_delivery(task_id):
+    _, data = await backend.post("/deliveries/confirm", params={"task_id": task_id})
+    return data
 
 async def api_get_tasks(telegram_id):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{BACKEND_URL}/tasks/{telegram_id}") as resp:
-            return await resp.json()
+    _, data = await backend.get(f"/tasks/{telegram_id}")
+    return data
 
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
@@ -115,6 +242,22 @@ async def cmd_start(message: types.Message):
             except Exception as e:
                 print(f"Ошибка при отправке админу {admin_id}: {e}")
 
+@dp.callback_query(F.data.startswith("approve:") | F.data.startswith("reject:"))
+async def handle_moderation(callback: types.CallbackQuery):
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("Недостаточно прав.", show_alert=True)
+        return
+    action, telegram_id, chat_id = callback.data.split(":")
+    status = "approved" if action == "approve" else "rejected"
+    await api_update_user_status(telegram_id, status)
+    await callback.answer("Готово")
+    verdict = "✅ Одобрен" if status == "approved" else "❌ Отклонён"
+    await callback.message.edit_text(f"{callback.message.html_text}\n\n{verdict}")
+    if status == "approved":
+        await bot.send_message(chat_id, "Ваша заявка одобрена. Добро пожаловать!", reply_markup=main_menu_keyboard())
+    else:
+        await bot.send_message(chat_id, "Ваша заявка отклонена. Доступ запрещён.")
+
 def main_menu_keyboard():
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -162,7 +305,7 @@ async def show_my_tasks(message: types.Message):
     if not tasks or (isinstance(tasks, dict) and tasks.get("detail") == "User not found") or len(tasks) == 0:
         await message.answer("У вас пока нет задач.")
         return
-    text = "<b>Ваши задачи:</b>\n"
+    text = "<b>Ваши последние задачи:</b>\n"
     for task in tasks:
         text += f"ID: <b>{task['task_id']}</b> | Статус: <b>{task['status']}</b>\nВидео: {task['video_url']}\n\n"
     await message.answer(text, parse_mode="HTML")
@@ -176,6 +319,23 @@ async def process_link_message(message: types.Message, state: FSMContext):
         await message.answer("Вы не одобрены для использования сервиса.")
         return
 
+    links = [link for link in re.findall(r'https?://\S+', url) if is_supported_link(link)]
+    if len(links) > 1:
+        # Несколько ссылок в одном сообщении — ставим все на скачивание одним запросом
+        result = await api_create_tasks_batch(telegram_id, links)
+        rejected = limit_message(result)
+        if rejected:
+            await message.answer(rejected)
+            return
+        tasks = result.get("tasks", [])
+        cached = [t["task_id"] for t in tasks if t.get("status") == "completed" and t.get("artifact_id")]
+        if cached:
+            await deliver_claimed(cached)
+        queued = [str(t["task_id"]) for t in tasks if t.get("status") != "completed"]
+        if queued:
+            await message.answer(f"Добавлено задач: <b>{len(queued)}</b> (ID: {', '.join(queued)}). Пришлю видео, как только они скачаются.")
+        return
+
     if is_supported_link(url):
         kb = InlineKeyboardMarkup(inline_keyboard=[
             [
@@ -187,31 +347,142 @@ async def process_link_message(message: types.Message, state: FSMContext):
     else:
         await message.answer("Пока поддерживаются только YouTube, VK Видео, RuTube и Яндекс.Дзен.")
 
-@dp.callback_query(F.data.startswith("download:"))
-async def handle_download(callback: types.CallbackQuery):
-    url = callback.data.split(":", 1)[1]
-    telegram_id = str(callback.from_user.id)
-    await callback.answer("⏳ Скачиваем видео...")
+async def send_file(chat_id, file_path, file_id=None, caption=None):
+    """Отправляет файл по file_id, если он уже был в Telegram, иначе загружает.
 
-    # Добавляем задачу в БД
-    await api_create_task(telegram_id, url, action="download")
+    Возвращает новый file_id после загрузки или None.
+    """
+    if file_id:
+        try:
+            await bot.send_document(chat_id, file_id, caption=caption)
+            return None
+        except TelegramBadRequest as e:
+            # file_id мог протухнуть — загрузим файл заново
+            print(f"file_id for {file_path} rejected: {e}")
+    message = await bot.send_document(chat_id, types.FSInputFile(file_path), caption=caption)
+    return message.document.file_id if message.document else None
 
-    await bot.send_message(telegram_id, "Начинаю скачивание видео. Это может занять несколько минут.")
-    os.makedirs(DOWNLOADS_PATH, exist_ok=True)
-    try:
-        # Запускаем скачивание (worker должен быть в папке backend)
-        result = subprocess.run(
-            ["python", "backend/download_worker.py", url, DOWNLOADS_PATH],
-            capture_output=True, text=True
+async def send_artifact(chat_id, task):
+    """Отправляет готовый файл задачи; большой файл — по частям, нарезанным воркером."""
+    parts = task.get("parts") or []
+    if not parts:
+        file_id = await send_file(chat_id, task["file_path"], task.get("telegram_file_id"))
+        if file_id:
+            await api_set_artifact_file_id(task["artifact_id"], file_id)
+        return
+    for n, part in enumerate(parts, 1):
+        file_id = await send_file(
+            chat_id, part["file_path"], part.get("telegram_file_id"), caption=f"Часть {n}/{len(parts)}"
         )
-        filepath = result.stdout.strip()
-        if os.path.isfile(filepath):
-            await bot.send_document(telegram_id, types.FSInputFile(filepath))
-            await bot.send_message(telegram_id, "✅ Видео успешно скачано!")
-        else:
-            await bot.send_message(telegram_id, "❌ Не удалось скачать видео (файл не найден).")
+        if file_id:
+            await api_set_part_file_id(part["part_id"], file_id)
+
+async def deliver_task(task):
+    """Отправляет пользователю результат задачи и отмечает её доставленной."""
+    chat_id = task["telegram_id"]
+    if task["status"] == "completed" and task.get("file_path"):
+        await send_artifact(chat_id, task)
+        done = "перезалито" if task.get("action") == "reupload" else "успешно скачано"
+        await bot.send_message(chat_id, f"✅ Видео {done}!")
+    elif task["status"] == "completed":
+        await bot.send_message(chat_id, "❌ Не удалось скачать видео (файл не найден).")
+    else:
+        await bot.send_message(chat_id, f"❌ Не удалось скачать видео: {task['video_url']}")
+    await api_confirm_delivery(task["task_id"])
+
+async def deliver_safely(task):
+    """deliver_task с учётом ошибок: повтор — когда backend снова отдаст задачу,
+    после MAX_DELIVERY_ATTEMPTS попыток backend закрывает доставку."""
+    try:
+        await deliver_task(task)
+    except Exception as e:
+        print(f"Delivery of task {task['task_id']} failed: {e}")
+        try:
+            result = await api_fail_delivery(task["task_id"], str(e))
+            if isinstance(result, dict) and result.get("gave_up"):
+                await bot.send_message(task["telegram_id"], f"❌ Не удалось отправить видео: {task['video_url']}")
+        except Exception as e:
+            print(f"Reporting failed delivery of task {task['task_id']} failed: {e}")
+
+async def deliver_claimed(task_ids):
+    """Отправляет задачи из кэша сразу. Если delivery_watcher уже забрал задачу, её отправит он."""
+    for task in await api_claim_deliveries(task_ids):
+        await deliver_safely(task)
+
+async def delivery_watcher():
+    """Фоновая рассылка готовых задач. Скачивание идёт в download_worker, бот только ждёт результат."""
+    semaphore = asyncio.Semaphore(DELIVERY_CONCURRENCY)
+
+    async def deliver(task):
+        async with semaphore:
+            await deliver_safely(task)
+
+    while True:
+        delivery_wakeup.clear()
+        try:
+            tasks = await api_claim_deliveries()
+            await asyncio.gather(*(deliver(task) for task in tasks))
+        except Exception as e:
+            print(f"Delivery watcher error: {e}")
+        try:
+            await asyncio.wait_for(delivery_wakeup.wait(), DELIVERY_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+async def notify_status(event):
+    try:
+        await bot.send_message(event["telegram_id"], STATUS_MESSAGES[event["status"]].format(**event))
     except Exception as e:
-        await bot.send_message(telegram_id, f"Ошибка при скачивании: {e}")
+        print(f"Status notification for task {event['task_id']} failed: {e}")
+
+async def task_event_listener():
+    """Слушает поток смен статусов из backend и сразу сообщает пользователям."""
+    pending = set()
+    delay = 1
+    while True:
+        try:
+            async for event in backend.events("/events/tasks"):
+                delay = 1
+                status = event.get("status")
+                if status in ("completed", "failed", "dead_letter"):
+                    delivery_wakeup.set()
+                elif status in STATUS_MESSAGES and event.get("telegram_id"):
+                    # Не ждём отправку, чтобы не тормозить чтение потока
+                    notification = asyncio.create_task(notify_status(event))
+                    pending.add(notification)
+                    notification.add_done_callback(pending.discard)
+        except Exception as e:
+            print(f"Task event stream error: {e}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 60)
+
+# Ответ на нажатие кнопки и текст после постановки в очередь для каждого action
+ACTION_MESSAGES = {
+    "download": ("⏳ Скачиваем видео...", "Пришлю видео, как только оно скачается."),
+    "reupload": ("⏳ Перезаливаем видео...", "Пришлю видео, как только оно скачается и пережмётся."),
+}
+
+@dp.callback_query(F.data.startswith("download:") | F.data.startswith("reupload:"))
+async def handle_download(callback: types.CallbackQuery):
+    action, _, url = callback.data.partition(":")
+    telegram_id = str(callback.from_user.id)
+    answer, queued_text = ACTION_MESSAGES[action]
+    await callback.answer(answer)
+
+    # Ставим задачу в очередь; её этапы выполняют воркеры, результат пришлёт delivery_watcher
+    task = await api_create_task(telegram_id, url, action=action)
+    rejected = limit_message(task)
+    if rejected:
+        await bot.send_message(telegram_id, rejected)
+        return
+    if task.get("status") == "completed" and task.get("artifact_id"):
+        # Видео уже есть в кэше — отправляем сразу
+        await deliver_claimed([task["task_id"]])
+        return
+    await bot.send_message(
+        telegram_id,
+        f"Задача <b>{task.get('task_id')}</b> поставлена в очередь. {queued_text}"
+    )
 
 @dp.message()
 async def catch_all(message: types.Message):
@@ -219,7 +490,26 @@ async def catch_all(message: types.Message):
         await message.answer("Пожалуйста, отправьте ссылку на видео или воспользуйтесь меню.")
 
 async def main():
-    await dp.start_polling(bot)
+    start_http_server(METRICS_PORT)
+    await backend.start()
+    jobs = (delivery_watcher, task_event_listener)
+    if shared_state:
+        # Рассылку и уведомления о статусах ведёт одна реплика; иначе каждая
+        # прочитала бы весь поток событий и разослала бы одни и те же уведомления
+        background = [asyncio.create_task(run_on_one_replica(DATABASE_URL, jobs, BACKGROUND_LOCK_ID))]
+    else:
+        background = [asyncio.create_task(job()) for job in jobs]
+    try:
+        if BOT_MODE == "webhook":
+            await serve_webhook(dp, bot, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT)
+        else:
+            # Telegram не отдаёт апдейты через getUpdates, пока установлен webhook
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        for job in background:
+            job.cancel()
+        await backend.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
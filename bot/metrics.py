@@ -0,0 +1,46 @@
+# bot/metrics.py
+#
+# Метрики Prometheus бота: время обработки апдейтов по хендлерам и
+# задержки запросов к backend. Отдаются HTTP-сервером prometheus_client.
+
+import re
+import time
+
+from aiogram import BaseMiddleware
+from prometheus_client import Histogram
+
+HANDLER_LATENCY = Histogram(
+    "vidmore_bot_handler_duration_seconds",
+    "Время обработки апдейта хендлером",
+    ["handler", "result"],
+)
+BACKEND_CALL_LATENCY = Histogram(
+    "vidmore_bot_backend_request_duration_seconds",
+    "Задержка запроса бота к backend (с учётом повторов)",
+    ["method", "path", "status"],
+)
+
+# id в пути и query-string превращаются в шаблон, чтобы не плодить метки
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def observe_backend_call(method, path, status, seconds):
+    """Колбэк для BackendClient(on_request=...)."""
+    path = _ID_SEGMENT.sub("/{id}", path.split("?", 1)[0])
+    BACKEND_CALL_LATENCY.labels(method, path, str(status)).observe(seconds)
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Меряет время хендлера; вешается на dp.message и dp.callback_query."""
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        result = "error"
+        try:
+            response = await handler(event, data)
+            result = "ok"
+            return response
+        finally:
+            handler_object = data.get("handler")
+            name = handler_object.callback.__name__ if handler_object else "unhandled"
+            HANDLER_LATENCY.labels(name, result).observe(time.perf_counter() - started)
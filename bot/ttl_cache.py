@@ -0,0 +1,41 @@
+# ttl_cache.py
+#
+# Маленький LRU-кэш с временем жизни записей. Рассчитан на один event loop,
+# поэтому обходится без блокировок.
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        # Растёт при каждом invalidate: значение, прочитанное до него, уже может быть устаревшим
+        self.version = 0
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, version=None):
+        """version — self.version на момент, когда value начали читать из источника;
+        если с тех пор был invalidate, значение не кэшируется."""
+        if version is not None and version != self.version:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self.version += 1
+        self._data.pop(key, None)
@@ -0,0 +1,74 @@
+# webhook.py
+#
+# Запуск бота в несколько реплик: приём апдейтов через webhook (aiohttp за
+# nginx) и фоновые задачи, которые должны крутиться только на одной реплике,
+# под pg advisory lock. Состояние диалогов — в backend/fsm_storage.py.
+
+import asyncio
+import signal
+
+import asyncpg
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from backend.fsm_storage import asyncpg_dsn
+
+
+async def run_on_one_replica(database_url, jobs, lock_id, check_interval=15):
+    """Запускает jobs (функции, возвращающие корутину) только на той реплике,
+    которая держит advisory lock lock_id.
+
+    Лок живёт, пока живо соединение: упала реплика — Postgres снимает лок, и
+    его забирает следующая (не позже чем через check_interval).
+    """
+    dsn = asyncpg_dsn(database_url)
+    while True:
+        conn = None
+        running = []
+        try:
+            conn = await asyncpg.connect(dsn)
+            if await conn.fetchval("SELECT pg_try_advisory_lock($1)", lock_id):
+                print("This replica runs background jobs")
+                running = [asyncio.create_task(job()) for job in jobs]
+                while True:
+                    await asyncio.sleep(check_interval)
+                    await conn.fetchval("SELECT 1")
+        except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            print(f"Background jobs lock lost: {e}")
+        finally:
+            for job in running:
+                job.cancel()
+            if conn is not None:
+                conn.terminate()
+        await asyncio.sleep(check_interval)
+
+
+async def serve_webhook(dp, bot, base_url, path, secret, host="0.0.0.0", port=8080):
+    """Регистрирует webhook в Telegram и принимает апдейты, пока не придёт SIGTERM/SIGINT.
+
+    Запросы без правильного X-Telegram-Bot-Api-Secret-Token отклоняются.
+    """
+    if not secret:
+        raise RuntimeError("WEBHOOK_SECRET is required in webhook mode")
+    # Все реплики ставят один и тот же URL — повторный вызов ничего не меняет
+    await bot.set_webhook(
+        base_url.rstrip("/") + path, secret_token=secret, allowed_updates=dp.resolve_used_update_types(),
+    )
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Webhook server listening on {host}:{port}{path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
@@ -0,0 +1,150 @@
+# download_worker/cache.py
+#
+# Кэш готовых файлов по cache_key (канонический id видео + формат).
+# Одно видео хранится в /downloads один раз, все задачи ссылаются на Artifact.
+# Когда суммарный размер превышает CACHE_MAX_BYTES, удаляются самые давно
+# запрошенные файлы (LRU). Файлы больше лимита Telegram хранятся только
+# нарезанными на части (ArtifactPart), path артефакта — папка с частями.
+
+import os
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from backend.models import Artifact, ArtifactPart, Task, TaskStatus
+from task_queue import ACTIVE_STATUSES
+
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(50 * 1024 ** 3)))
+
+
+def lookup_artifact(session, key):
+    """Готовый файл по ключу или None. Отмечает обращение для LRU."""
+    artifact = session.query(Artifact).filter_by(cache_key=key).first()
+    if artifact is None or not os.path.exists(artifact.path):
+        return None
+    artifact.last_accessed_at = func.now()
+    session.commit()
+    return artifact
+
+
+def register_artifact(session, key, path, part_paths=()):
+    """Записывает скачанный файл в кэш или обновляет запись с тем же ключом.
+
+    Если переданы part_paths, артефакт — это части, а path — папка с ними.
+    """
+    part_sizes = [os.path.getsize(p) for p in part_paths]
+    size = sum(part_sizes) if part_paths else os.path.getsize(path)
+    for _ in range(2):
+        artifact = session.query(Artifact).filter_by(cache_key=key).with_for_update().first()
+        if artifact is None:
+            artifact = Artifact(cache_key=key, path=path, size_bytes=size)
+            session.add(artifact)
+        else:
+            artifact.path = path
+            artifact.size_bytes = size
+            artifact.last_accessed_at = func.now()
+            artifact.telegram_file_id = None
+        artifact.parts = [
+            ArtifactPart(part_index=i, path=p, size_bytes=part_size)
+            for i, (p, part_size) in enumerate(zip(part_paths, part_sizes))
+        ]
+        try:
+            session.commit()
+            return artifact
+        except IntegrityError:
+            # Параллельный воркер успел вставить тот же ключ — обновим его запись
+            session.rollback()
+    raise RuntimeError(f"Could not register artifact {key}")
+
+
+def delete_artifact(session, artifact):
+    """Удаляет файл, его части и запись; задачи просто теряют ссылку на файл."""
+    for path in [part.path for part in artifact.parts]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    try:
+        if os.path.isdir(artifact.path):
+            os.rmdir(artifact.path)
+        else:
+            os.remove(artifact.path)
+    except OSError:
+        pass
+    session.execute(
+        update(Task)
+        .where(Task.artifact_id == artifact.id)
+        .values(artifact_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    session.delete(artifact)
+
+
+def eviction_candidates(session):
+    """Артефакты от давно использованных к недавним, кроме тех, что ещё нужны задачам.
+
+    Нужны незавершённым задачам (исходник перезалива — до конца этапа
+    transcode) и завершённым, которые бот ещё не доставил.
+    """
+    in_use = select(Task.artifact_id).where(
+        Task.artifact_id.isnot(None),
+        or_(
+            Task.status.in_(ACTIVE_STATUSES),
+            and_(Task.status == TaskStatus.completed, Task.delivered_at.is_(None)),
+        ),
+    )
+    return session.execute(
+        select(Artifact)
+        .where(Artifact.id.not_in(in_use))
+        .order_by(Artifact.last_accessed_at)
+        .with_for_update(skip_locked=True)
+    ).scalars()
+
+
+def evict_lru(session, max_bytes=CACHE_MAX_BYTES):
+    """Удаляет самые давно использованные файлы, пока кэш больше max_bytes."""
+    total = session.query(func.coalesce(func.sum(Artifact.size_bytes), 0)).scalar()
+    if total <= max_bytes:
+        return 0
+    evicted = 0
+    for artifact in eviction_candidates(session):
+        if total <= max_bytes:
+            break
+        total -= artifact.size_bytes
+        delete_artifact(session, artifact)
+        evicted += 1
+    session.commit()
+    return evicted
+
+
+def evict_bytes(session, bytes_to_free):
+    """Удаляет самые давно использованные файлы, пока не освободится bytes_to_free.
+
+    Возвращает (сколько файлов удалено, сколько байт освобождено).
+    """
+    evicted, freed = 0, 0
+    for artifact in eviction_candidates(session):
+        if freed >= bytes_to_free:
+            break
+        freed += artifact.size_bytes
+        delete_artifact(session, artifact)
+        evicted += 1
+    session.commit()
+    return evicted, freed
+
+
+def pending_uploads(session, artifact_id):
+    """Что из артефакта ещё не загружено в Telegram: [(модель, id, путь)], части по порядку."""
+    artifact = session.get(Artifact, artifact_id)
+    items = artifact.parts or [artifact]
+    return [(type(item), item.id, item.path) for item in items if not item.telegram_file_id]
+
+
+def save_file_id(session, model, item_id, file_id):
+    session.execute(
+        update(model)
+        .where(model.id == item_id)
+        .values(telegram_file_id=file_id)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
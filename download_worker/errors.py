@@ -0,0 +1,36 @@
+# download_worker/errors.py
+#
+# Какие ошибки скачивания стоит повторять. yt-dlp почти всё заворачивает в
+# DownloadError с текстом исходной ошибки, поэтому классифицируем по тексту.
+
+# Видео нет или оно недоступно этому воркеру в принципе — повтор не поможет
+PERMANENT_ERROR_MARKERS = (
+    "unsupported url",
+    "is not a valid url",
+    "video unavailable",
+    "this video is not available",
+    "private video",
+    "has been removed",
+    "copyright",
+    "sign in to confirm your age",
+    "http error 404",
+    "http error 410",
+    "no video formats found",
+    "requested format is not available",
+)
+
+
+def is_transient_error(exc):
+    """True, если задачу стоит повторить позже.
+
+    Сетевые сбои, таймауты, 429/5xx и прочие неизвестные ошибки считаются
+    временными: если ошибка на самом деле постоянная, задача всё равно
+    остановится после MAX_ATTEMPTS попыток (dead_letter).
+    """
+    message = str(exc).lower()
+    return not any(marker in message for marker in PERMANENT_ERROR_MARKERS)
+
+
+class InsufficientDiskSpace(Exception):
+    """Под файл задачи сейчас нет места на томе. Это не сбой задачи: её
+    откладывают до уборки, не расходуя попытки."""
@@ -0,0 +1,159 @@
+# download_worker/janitor.py
+#
+# Уборка тома /downloads. Раз в JANITOR_INTERVAL:
+#  - если занято больше DISK_HIGH_WATERMARK, вытесняет давно не
+#    использованные артефакты (LRU), пока занятость не опустится до
+#    DISK_LOW_WATERMARK;
+#  - удаляет файлы, на которые не ссылается ни один артефакт (остались
+#    после падений), и рабочие папки завершённых, упавших и удалённых задач.
+# Убирает только один воркер за раз: на Postgres берётся advisory lock.
+# Метрики диска обновляет каждый воркер.
+
+import os
+import re
+import shutil
+import threading
+import time
+
+from sqlalchemy import select, text
+
+from backend.models import Artifact, ArtifactPart, Task
+from cache import evict_bytes
+from metrics import CACHE_BYTES, DISK_FREE_BYTES, DISK_TOTAL_BYTES, JANITOR_FREED_BYTES
+from task_queue import ACTIVE_STATUSES
+
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "300"))
+# Через сколько вернуть в работу задачу, под которую не хватило места
+DISK_RETRY_SECONDS = float(os.getenv("DISK_RETRY_SECONDS", "120"))
+DISK_HIGH_WATERMARK = float(os.getenv("DISK_HIGH_WATERMARK", "0.85"))
+DISK_LOW_WATERMARK = float(os.getenv("DISK_LOW_WATERMARK", "0.70"))
+# Ниже этого свободного места воркеры не берут новые задачи
+DISK_MIN_FREE_BYTES = int(os.getenv("DISK_MIN_FREE_BYTES", str(5 * 1024 ** 3)))
+# Файлы моложе этого не трогаем: воркер мог ещё не записать артефакт в БД
+ORPHAN_GRACE_SECONDS = float(os.getenv("ORPHAN_GRACE_SECONDS", "3600"))
+# Ключ pg advisory lock уборщика, общий для всех воркеров
+JANITOR_LOCK_ID = 7420011
+
+# Что воркеры кладут в DOWNLOAD_DIR: {task_id}.mp4, {task_id}_reupload.mp4,
+# {task_id}_source.mp4 и папки с частями
+MANAGED_NAME = re.compile(r"^\d+(_reupload|_source)?(\.mp4|_parts)$")
+
+
+def disk_free(path):
+    """Свободное место на томе path; заодно обновляет метрики диска."""
+    usage = shutil.disk_usage(path)
+    DISK_TOTAL_BYTES.set(usage.total)
+    DISK_FREE_BYTES.set(usage.free)
+    return usage.free
+
+
+def has_free_space(path, needed=0):
+    return disk_free(path) - needed >= DISK_MIN_FREE_BYTES
+
+
+def _age(entry):
+    # ctime меняется и при переносе файла, mtime yt-dlp может взять из заголовков
+    stat = entry.stat(follow_symlinks=False)
+    return time.time() - max(stat.st_mtime, stat.st_ctime)
+
+
+def _remove(path):
+    size = 0
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        size = os.path.getsize(path)
+        os.remove(path)
+    return size
+
+
+def remove_orphans(session, download_dir, work_dir, grace=ORPHAN_GRACE_SECONDS):
+    """Удаляет файлы без артефакта и рабочие папки задач, которым они больше не нужны.
+
+    Возвращает число освобождённых байт.
+    """
+    known = set(session.scalars(select(Artifact.path)))
+    part_paths = list(session.scalars(select(ArtifactPart.path)))
+    known.update(os.path.dirname(p) for p in part_paths)
+    freed = 0
+    for entry in os.scandir(download_dir):
+        if not MANAGED_NAME.match(entry.name) or entry.path in known or _age(entry) < grace:
+            continue
+        freed += _remove(entry.path)
+
+    if os.path.isdir(work_dir):
+        entries = [e for e in os.scandir(work_dir) if e.name.isdigit() and _age(e) >= grace]
+        task_ids = [int(e.name) for e in entries]
+        active = set(session.scalars(
+            select(Task.id).where(Task.id.in_(task_ids), Task.status.in_(ACTIVE_STATUSES))
+        )) if task_ids else set()
+        for entry in entries:
+            if int(entry.name) not in active:
+                freed += _remove(entry.path)
+    session.commit()
+    return freed
+
+
+class Janitor(threading.Thread):
+    """Фоновая уборка тома; wake() запускает проход досрочно (например, когда места не хватает)."""
+
+    def __init__(self, engine, session_factory, download_dir, work_dir, interval=JANITOR_INTERVAL):
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.session_factory = session_factory
+        self.download_dir = download_dir
+        self.work_dir = work_dir
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Janitor failed: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def run_once(self):
+        disk_free(self.download_dir)
+        with self.engine.connect() as conn:
+            postgres = conn.dialect.name == "postgresql"
+            if postgres:
+                locked = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": JANITOR_LOCK_ID}).scalar()
+                conn.commit()
+                if not locked:
+                    # Убирает другой воркер
+                    return
+            try:
+                self._collect()
+            finally:
+                if postgres:
+                    conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": JANITOR_LOCK_ID})
+                    conn.commit()
+
+    def _collect(self):
+        with self.session_factory() as session:
+            freed = remove_orphans(session, self.download_dir, self.work_dir)
+            if freed:
+                JANITOR_FREED_BYTES.labels("orphan").inc(freed)
+                print(f"Janitor: removed {freed} bytes of orphaned files")
+
+            usage = shutil.disk_usage(self.download_dir)
+            if usage.used > usage.total * DISK_HIGH_WATERMARK:
+                evicted, freed = evict_bytes(session, usage.used - usage.total * DISK_LOW_WATERMARK)
+                JANITOR_FREED_BYTES.labels("evicted").inc(freed)
+                print(f"Janitor: disk above high watermark, evicted {evicted} artifact(s), {freed} bytes")
+
+            CACHE_BYTES.set(sum(session.scalars(select(Artifact.size_bytes))))
+        disk_free(self.download_dir)
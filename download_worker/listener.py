@@ -0,0 +1,73 @@
+# download_worker/listener.py
+#
+# Блокирующее ожидание NOTIFY от Postgres вместо постоянного опроса таблицы.
+
+import os
+import select
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+
+class TaskListener:
+    """Ждёт NOTIFY на канале задач. wake() прерывает ожидание из других потоков.
+
+    Если база не Postgres или соединение потеряно, wait() просто спит до
+    таймаута, и воркер откатывается на редкий опрос.
+    """
+
+    def __init__(self, engine, channel):
+        self.engine = engine
+        self.channel = channel
+        self._conn = None
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._rfd, False)
+        os.set_blocking(self._wfd, False)
+
+    def connect(self):
+        if self._conn is not None or self.engine.dialect.name != "postgresql":
+            return
+        url = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        try:
+            conn = psycopg2.connect(url)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.channel}")
+        except psycopg2.Error as e:
+            print(f"LISTEN {self.channel} failed, falling back to polling: {e}")
+            return
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def wake(self):
+        try:
+            os.write(self._wfd, b"x")
+        except BlockingIOError:
+            pass  # пайп уже полон — ожидание и так будет прервано
+
+    def wait(self, timeout):
+        """Блокируется до NOTIFY, wake() или таймаута. True — пришло уведомление."""
+        self.connect()
+        fds = [self._rfd] if self._conn is None else [self._rfd, self._conn]
+        ready, _, _ = select.select(fds, [], [], timeout)
+        if self._rfd in ready:
+            try:
+                while os.read(self._rfd, 1024):
+                    pass
+            except BlockingIOError:
+                pass
+        notified = False
+        if self._conn is not None and self._conn in ready:
+            try:
+                self._conn.poll()
+            except psycopg2.Error as e:
+                print(f"LISTEN connection lost: {e}")
+                self.close()
+                return False
+            notified = bool(self._conn.notifies)
+            self._conn.notifies.clear()
+        return notified
@@ -0,0 +1,73 @@
+# download_worker/media.py
+#
+# Обработка видео ffmpeg:
+#  - нарезка для Telegram по ключевым кадрам без перекодирования (-c copy),
+#    почти бесплатно даже для многогигабайтных файлов;
+#  - пережатие в H.264/AAC mp4 для перезалива — тяжёлая по CPU работа,
+#    её делают отдельные воркеры этапа transcode.
+
+import os
+import subprocess
+
+# Потоков ffmpeg на одно пережатие; воркер transcode по умолчанию запускает
+# ядра / FFMPEG_THREADS пережатий одновременно
+FFMPEG_THREADS = int(os.getenv("FFMPEG_THREADS", "2"))
+TRANSCODE_MAX_HEIGHT = int(os.getenv("TRANSCODE_MAX_HEIGHT", "720"))
+TRANSCODE_CRF = os.getenv("TRANSCODE_CRF", "23")
+TRANSCODE_PRESET = os.getenv("TRANSCODE_PRESET", "veryfast")
+# Если часть всё равно вышла больше лимита (длинный GOP), режем мельче
+SPLIT_ATTEMPTS = 4
+SPLIT_SHRINK = 0.7
+
+
+def probe_duration(path):
+    """Длительность видео в секундах по ffprobe."""
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return float(out.strip())
+
+
+def split_video(path, out_dir, max_bytes):
+    """Режет видео на части не больше max_bytes. Возвращает пути частей по порядку.
+
+    Длина сегмента считается из среднего битрейта с запасом; части режутся
+    только по ключевым кадрам, поэтому размер проверяется после нарезки.
+    """
+    size = os.path.getsize(path)
+    duration = probe_duration(path)
+    segment_time = duration * max_bytes * 0.9 / size
+    os.makedirs(out_dir, exist_ok=True)
+    for _ in range(SPLIT_ATTEMPTS):
+        for name in os.listdir(out_dir):
+            os.remove(os.path.join(out_dir, name))
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-i", path, "-map", "0", "-c", "copy",
+             "-f", "segment", "-segment_time", f"{segment_time:.3f}", "-reset_timestamps", "1",
+             os.path.join(out_dir, "part%03d.mp4")],
+            check=True, capture_output=True,
+        )
+        parts = [os.path.join(out_dir, name) for name in sorted(os.listdir(out_dir))]
+        if all(os.path.getsize(p) <= max_bytes for p in parts):
+            return parts
+        segment_time *= SPLIT_SHRINK
+    raise RuntimeError(f"Could not split {path} into parts under {max_bytes} bytes")
+
+
+def transcode_video(src, dst, max_height=TRANSCODE_MAX_HEIGHT):
+    """Пережимает src в H.264/AAC mp4 не выше max_height с moov в начале файла.
+
+    Такой файл Telegram показывает как видео и воспроизводит без скачивания целиком.
+    """
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-i", src,
+         "-map", "0:v:0", "-map", "0:a:0?",
+         "-vf", f"scale=-2:'min({max_height},ih)'",
+         "-c:v", "libx264", "-preset", TRANSCODE_PRESET, "-crf", TRANSCODE_CRF, "-pix_fmt", "yuv420p",
+         "-c:a", "aac", "-b:a", "128k",
+         "-movflags", "+faststart", "-threads", str(FFMPEG_THREADS),
+         dst],
+        check=True, capture_output=True,
+    )
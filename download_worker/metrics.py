@@ -0,0 +1,34 @@
+# download_worker/metrics.py
+#
+# Метрики Prometheus воркера: длительность и скорость скачиваний по
+# платформам, длительность пережатий, занятые слоты, время ожидания в
+# очереди и место на диске. Запросы к БД и время в статусах — в backend/db_metrics.py.
+# Отдаются HTTP-сервером prometheus_client на METRICS_PORT.
+
+from prometheus_client import Counter, Gauge, Histogram
+
+DOWNLOAD_DURATION = Histogram(
+    "vidmore_download_duration_seconds",
+    "Длительность скачивания видео",
+    ["platform", "result"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+DOWNLOAD_BYTES = Counter("vidmore_download_bytes_total", "Скачано байт", ["platform"])
+DOWNLOAD_SPEED = Histogram(
+    "vidmore_download_speed_bytes_per_second",
+    "Средняя скорость скачивания одного видео",
+    ["platform"],
+    buckets=(1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8),
+)
+TRANSCODE_DURATION = Histogram(
+    "vidmore_transcode_duration_seconds",
+    "Длительность пережатия видео",
+    ["result"],
+    buckets=(5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+)
+ACTIVE_DOWNLOADS = Gauge("vidmore_active_downloads", "Скачивания, идущие прямо сейчас", ["platform"])
+DISK_TOTAL_BYTES = Gauge("vidmore_disk_total_bytes", "Размер тома с загрузками")
+DISK_FREE_BYTES = Gauge("vidmore_disk_free_bytes", "Свободно на томе с загрузками")
+CACHE_BYTES = Gauge("vidmore_cache_bytes", "Суммарный размер артефактов по данным БД")
+JANITOR_FREED_BYTES = Counter("vidmore_janitor_freed_bytes_total", "Освобождено уборщиком", ["reason"])
+CLAIMS_DEFERRED = Counter("vidmore_claims_deferred_total", "Сколько раз воркер не брал или откладывал задачи из-за нехватки места")
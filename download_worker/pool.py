@@ -0,0 +1,68 @@
+# download_worker/pool.py
+#
+# Пул параллельных скачиваний внутри одного процесса воркера
+# с отдельным лимитом одновременных загрузок на каждую платформу.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_host_limits(value):
+    """'youtube=2,vk=3' -> {'youtube': 2, 'vk': 3}"""
+    limits = {}
+    for item in value.replace(" ", "").split(","):
+        if not item:
+            continue
+        host, _, limit = item.partition("=")
+        limits[host] = int(limit)
+    return limits
+
+
+class DownloadPool:
+    """Пул из size потоков; задачи одного хоста не занимают больше его лимита."""
+
+    def __init__(self, size, host_limits=None, on_done=None):
+        self.size = size
+        self.host_limits = host_limits or {}
+        self.on_done = on_done
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="download")
+        self._lock = threading.Lock()
+        self._active = 0
+        self._per_host = {}
+
+    def _host_limit(self, host):
+        return self.host_limits.get(host or "other", self.size)
+
+    def has_free_slot(self):
+        with self._lock:
+            return self._active < self.size
+
+    def host_available(self, host):
+        with self._lock:
+            return self._per_host.get(host, 0) < self._host_limit(host)
+
+    def active(self):
+        with self._lock:
+            return self._active
+
+    def submit(self, host, fn, *args):
+        with self._lock:
+            self._active += 1
+            self._per_host[host] = self._per_host.get(host, 0) + 1
+        self._executor.submit(self._run, host, fn, *args)
+
+    def _run(self, host, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Unhandled error in download thread: {e}")
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._per_host[host] -= 1
+            if self.on_done:
+                self.on_done()
+
+    def shutdown(self):
+        """Ждёт завершения всех текущих скачиваний (graceful drain)."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,134 @@
+# download_worker/probe.py
+#
+# Дешёвый probe перед скачиванием: yt-dlp extract_info(download=False)
+# возвращает список форматов, из него выбирается формат, который влезает в
+# MAX_DOWNLOAD_BYTES и MAX_VIDEO_HEIGHT и по возможности склеивается в mp4
+# без перекодирования (H.264 + AAC). Метаданные кэшируются в probe_cache по
+# canonical_id на PROBE_CACHE_TTL — повторы и одинаковые ссылки не ходят в сеть.
+
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from backend.links import canonical_id
+from backend.models import ProbeCache, Task
+
+PROBE_CACHE_TTL = int(os.getenv("PROBE_CACHE_TTL", str(6 * 3600)))
+MAX_VIDEO_HEIGHT = int(os.getenv("MAX_VIDEO_HEIGHT", "1080"))
+# Telegram не отдаёт пользователю файлы больше 2 ГБ
+MAX_DOWNLOAD_BYTES = int(os.getenv("MAX_DOWNLOAD_BYTES", str(2000 * 1024 * 1024)))
+DEFAULT_FORMAT = "bestvideo+bestaudio/best"
+
+# Из формата храним только то, что нужно для выбора; ссылки на потоки протухают
+FORMAT_FIELDS = ("format_id", "ext", "vcodec", "acodec", "width", "height", "filesize", "filesize_approx", "tbr")
+
+
+def extract_formats(video_url):
+    import yt_dlp
+    with yt_dlp.YoutubeDL({"quiet": True, "noplaylist": True}) as ydl:
+        info = ydl.extract_info(video_url, download=False)
+    return {
+        "duration": info.get("duration"),
+        "formats": [{k: f.get(k) for k in FORMAT_FIELDS} for f in info.get("formats") or []],
+    }
+
+
+def probe_video(session, video_url):
+    """Метаданные видео из кэша или от yt-dlp."""
+    key = canonical_id(video_url)
+    cached = session.get(ProbeCache, key)
+    if cached is not None:
+        fetched_at = cached.fetched_at
+        if fetched_at.tzinfo is None:
+            fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+        if datetime.now(timezone.utc) - fetched_at < timedelta(seconds=PROBE_CACHE_TTL):
+            info = cached.info
+            session.commit()
+            return info
+    # Транзакцию на время сетевого запроса не держим
+    session.commit()
+    info = extract_formats(video_url)
+    session.merge(ProbeCache(key=key, info=info, fetched_at=datetime.now(timezone.utc)))
+    try:
+        session.commit()
+    except IntegrityError:
+        # Тот же probe параллельно сохранил другой воркер
+        session.rollback()
+    return info
+
+
+def _has(fmt, codec):
+    return (fmt.get(codec) or "none") != "none"
+
+
+def _size(fmt, duration):
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if not size and fmt.get("tbr") and duration:
+        # tbr в кбит/с
+        size = int(fmt["tbr"] * 125 * duration)
+    return size
+
+
+def choose_format(info, max_height=MAX_VIDEO_HEIGHT, max_bytes=MAX_DOWNLOAD_BYTES):
+    """Выбирает формат: {"format_id", "expected_size_bytes", "height"} или None.
+
+    Среди вариантов, что влезают в max_bytes (размер неизвестен — считаем,
+    что влезает), берётся наибольшая высота не выше max_height; при равной —
+    H.264 + AAC (склейка в mp4 без перекодирования), затем меньший размер.
+    Если не влезает ничего — самый маленький вариант. None — форматов нет,
+    качаем DEFAULT_FORMAT.
+    """
+    duration = info.get("duration")
+    formats = info.get("formats") or []
+    videos = [f for f in formats if _has(f, "vcodec") and f.get("height") and f["height"] <= max_height]
+    audios = [f for f in formats if _has(f, "acodec") and not _has(f, "vcodec")]
+    audio = max(
+        audios, key=lambda a: (str(a.get("acodec")).startswith("mp4a"), a.get("tbr") or 0), default=None,
+    )
+
+    candidates = []
+    for video in videos:
+        if _has(video, "acodec"):
+            # Видео со звуком одним файлом, склейка не нужна
+            spec, size = video["format_id"], _size(video, duration)
+            copy_friendly = str(video.get("vcodec")).startswith("avc1") and video.get("ext") == "mp4"
+        elif audio is not None:
+            spec = f"{video['format_id']}+{audio['format_id']}"
+            video_size, audio_size = _size(video, duration), _size(audio, duration)
+            size = video_size + audio_size if video_size and audio_size else None
+            copy_friendly = str(video.get("vcodec")).startswith("avc1") and str(audio.get("acodec")).startswith("mp4a")
+        else:
+            continue
+        candidates.append({"format_id": spec, "expected_size_bytes": size, "height": video["height"], "copy": copy_friendly})
+    if not candidates:
+        return None
+
+    fitting = [c for c in candidates if c["expected_size_bytes"] is None or c["expected_size_bytes"] <= max_bytes]
+    if fitting:
+        best = max(fitting, key=lambda c: (c["height"], c["copy"], -(c["expected_size_bytes"] or 0)))
+    else:
+        best = min(candidates, key=lambda c: c["expected_size_bytes"])
+    return {k: best[k] for k in ("format_id", "expected_size_bytes", "height")}
+
+
+def format_selector(choice):
+    """Строка format для yt-dlp; если выбранный формат исчез, берётся лучший в пределах высоты."""
+    if choice is None:
+        return DEFAULT_FORMAT
+    height = choice["height"]
+    return f"{choice['format_id']}/bestvideo[height<={height}]+bestaudio/best[height<={height}]/best"
+
+
+def save_task_format(session, task_id, choice):
+    """Показывает выбранный формат на задаче."""
+    if choice is None:
+        return
+    session.execute(
+        update(Task)
+        .where(Task.id == task_id)
+        .values(**choice)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
@@ -0,0 +1,354 @@
+# download_worker/task_queue.py
+#
+# Захват задач несколькими воркерами. Задача берётся одним запросом
+# SELECT ... FOR UPDATE SKIP LOCKED и сразу получает аренду (lease):
+# id воркера + время истечения. Пока воркер жив, он продлевает аренду;
+# если воркер упал, reaper возвращает задачу в очередь.
+
+import os
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, func, select, update, or_
+from sqlalchemy.orm import aliased
+
+from backend.models import Task, TaskStatus
+from backend.notifications import notify_sync, TASKS_CHANNEL
+from backend.db_metrics import observe_status_change
+
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "120"))
+# Сколько задач просматривать за один захват, если часть из них нам не подходит
+CLAIM_SCAN_LIMIT = int(os.getenv("CLAIM_SCAN_LIMIT", "20"))
+
+# Сколько раз воркеры берут задачу, прежде чем она уйдёт в dead_letter
+MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "5"))
+# Задержка перед повтором: RETRY_BASE_SECONDS * 2^(попытка-1), не больше RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", "30"))
+RETRY_MAX_SECONDS = float(os.getenv("RETRY_MAX_SECONDS", "1800"))
+# last_error обрезается до этой длины
+MAX_ERROR_LENGTH = 1000
+
+# Статусы, в которых задача принадлежит конкретному воркеру
+LEASED_STATUSES = (TaskStatus.downloading, TaskStatus.processing, TaskStatus.uploading)
+ACTIVE_STATUSES = (TaskStatus.queued,) + LEASED_STATUSES
+# Статус задачи, взятой воркером этапа
+STAGE_STATUSES = {"download": TaskStatus.downloading, "transcode": TaskStatus.processing}
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def claim_task(session, worker_id, stage="download", lease_seconds=LEASE_SECONDS, accept=None):
+    """Атомарно берёт задачу из очереди и выдаёт на неё аренду.
+
+    Порядок: сначала больший priority, затем честная очередь по
+    пользователям — n-я задача пользователя в очереди стоит на месте
+    n + (сколько его задач уже качается), так что пачка ссылок одного
+    пользователя не задерживает остальных; внутри пользователя — FIFO по id.
+    Повторы не берутся раньше next_attempt_at; attempts увеличивается при
+    каждом захвате.
+
+    Строки блокируются через FOR UPDATE SKIP LOCKED, поэтому параллельные
+    воркеры никогда не получат одну и ту же задачу. accept(task) позволяет
+    пропустить задачи, которые воркер сейчас взять не может (например,
+    лимит платформы исчерпан); блокировки с пропущенных строк снимаются
+    при commit. Возвращает Task или None.
+    """
+    # Оконные функции несовместимы с FOR UPDATE, поэтому очерёдность считается
+    # в подзапросе, а блокируются только строки tasks во внешнем запросе
+    queued = (
+        select(
+            Task.id.label("task_id"),
+            Task.user_id,
+            func.row_number().over(partition_by=Task.user_id, order_by=(Task.priority.desc(), Task.id)).label("user_rank"),
+        )
+        .where(
+            Task.status == TaskStatus.queued,
+            Task.stage == stage,
+            Task.leader_task_id.is_(None),  # ведомые задачи ждут лидера, их не берём
+            or_(Task.next_attempt_at.is_(None), Task.next_attempt_at <= utcnow()),
+        )
+        .subquery()
+    )
+    running = (
+        select(Task.user_id, func.count(Task.id).label("running"))
+        .where(Task.status.in_(LEASED_STATUSES), Task.leader_task_id.is_(None))
+        .group_by(Task.user_id)
+        .subquery()
+    )
+    stmt = (
+        select(Task)
+        .join(queued, queued.c.task_id == Task.id)
+        .outerjoin(running, running.c.user_id == queued.c.user_id)
+        .order_by(Task.priority.desc(), queued.c.user_rank + func.coalesce(running.c.running, 0), Task.id)
+        .limit(1 if accept is None else CLAIM_SCAN_LIMIT)
+        .with_for_update(skip_locked=True, of=Task)
+    )
+    candidates = session.execute(stmt).scalars().all()
+    task = next((t for t in candidates if accept is None or accept(t)), None)
+    if task is None:
+        session.rollback()
+        return None
+    status = STAGE_STATUSES.get(stage, TaskStatus.processing)
+    # Время ожидания в очереди
+    observe_status_change(task, status)
+    task.status = status
+    task.attempts = (task.attempts or 0) + 1
+    task.worker_id = worker_id
+    task.lease_expires_at = utcnow() + timedelta(seconds=lease_seconds)
+    sync_followers(session, task.id, status=status)
+    session.commit()
+    return task
+
+
+def sync_followers(session, leader_id, **values):
+    """Переносит изменения лидера (статус, файл) на его ведомые задачи."""
+    session.execute(
+        update(Task)
+        .where(Task.leader_task_id == leader_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def attach_to_leader(session, task_id, key, worker_id):
+    """Если то же видео уже качает более ранняя задача, делает нашу её ведомой.
+
+    Нужна на случай гонки, когда две задачи с одним cache_key попали в
+    очередь лидерами. Уступает всегда задача с большим id, поэтому две
+    задачи не могут одновременно уйти друг к другу в ведомые. Возвращает
+    id лидера или None, если качать нужно самим.
+    """
+    leader = session.execute(
+        select(Task)
+        .where(
+            Task.cache_key == key,
+            Task.id < task_id,
+            Task.leader_task_id.is_(None),
+            Task.status.in_(LEASED_STATUSES),
+        )
+        .order_by(Task.id)
+        .limit(1)
+        .with_for_update()
+    ).scalars().first()
+    if leader is None:
+        session.rollback()
+        return None
+    result = session.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.worker_id == worker_id)
+        .values(leader_task_id=leader.id, status=leader.status, worker_id=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        session.rollback()
+        return None
+    # Наши собственные ведомые переходят к новому лидеру
+    session.execute(
+        update(Task)
+        .where(Task.leader_task_id == task_id)
+        .values(leader_task_id=leader.id, status=leader.status)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return leader.id
+
+
+def update_leased(session, task_id, owner, **values):
+    """UPDATE задачи, только если аренда всё ещё у воркера owner. Строка блокируется на время
+    транзакции; при смене статуса отмечается, сколько задача пробыла в прежнем.
+    Возвращает True, если задача обновлена; commit делает вызывающий."""
+    task = session.execute(
+        select(Task)
+        .where(Task.id == task_id, Task.worker_id == owner, Task.status.in_(LEASED_STATUSES))
+        .with_for_update()
+    ).scalars().first()
+    if task is None:
+        return False
+    if "status" in values:
+        observe_status_change(task, values["status"])
+    session.execute(
+        update(Task)
+        .where(Task.id == task_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+def renew_lease(session, task_id, worker_id, lease_seconds=LEASE_SECONDS):
+    """Продлевает аренду. False — задачу уже забрал reaper или другой воркер."""
+    result = session.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.worker_id == worker_id, Task.status.in_(LEASED_STATUSES))
+        .values(lease_expires_at=utcnow() + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def advance_task(session, task_id, worker_id, status):
+    """Переводит задачу на следующий этап (processing, uploading), если аренда всё ещё наша."""
+    updated = update_leased(session, task_id, worker_id, status=status)
+    if updated:
+        sync_followers(session, task_id, status=status)
+    session.commit()
+    return updated
+
+
+def hand_off(session, task_id, worker_id, stage, **values):
+    """Передаёт задачу воркерам следующего этапа через очередь, если аренда наша.
+
+    У этапа свой бюджет попыток; воркеры этапа будятся через NOTIFY.
+    """
+    updated = update_leased(
+        session, task_id, worker_id,
+        stage=stage, status=TaskStatus.queued, worker_id=None, lease_expires_at=None,
+        attempts=0, next_attempt_at=None, **values,
+    )
+    if updated:
+        sync_followers(session, task_id, status=TaskStatus.queued)
+        notify_sync(session, TASKS_CHANNEL, {"task_ids": [task_id], "stage": stage})
+    session.commit()
+    return updated
+
+
+def finish_task(session, task_id, worker_id, status, **values):
+    """Ставит итоговый статус (и прочие поля из values), только если аренда всё ещё наша."""
+    updated = update_leased(session, task_id, worker_id, status=status, worker_id=None, lease_expires_at=None, **values)
+    if updated:
+        sync_followers(session, task_id, status=status, **values)
+    session.commit()
+    return updated
+
+
+def retry_delay(attempt):
+    """Экспоненциальная задержка перед повтором со случайным разбросом.
+
+    Разброс в половину задержки, чтобы задачи, упавшие вместе (например,
+    платформа начала отвечать 429), не вернулись все в одну секунду.
+    """
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def retry_task(session, task_id, worker_id, error, delay, count_attempt=True):
+    """Возвращает задачу в очередь не раньше чем через delay секунд, если аренда наша.
+
+    count_attempt=False — задачу откладывают не из-за её ошибки (например, кончилось
+    место на диске), и захват не засчитывается в MAX_ATTEMPTS.
+    """
+    values = {
+        "status": TaskStatus.queued,
+        "worker_id": None,
+        "lease_expires_at": None,
+        "next_attempt_at": utcnow() + timedelta(seconds=delay),
+        "last_error": error,
+    }
+    if not count_attempt:
+        values["attempts"] = case((Task.attempts > 0, Task.attempts - 1), else_=0)
+    updated = update_leased(session, task_id, worker_id, **values)
+    if updated:
+        sync_followers(session, task_id, status=TaskStatus.queued)
+    session.commit()
+    return updated
+
+
+def sync_followers_of_leaders_in(session, status):
+    """Ведомые задачи, чей лидер уже в status, а они ещё в рабочем статусе, догоняют лидера."""
+    leader = aliased(Task)
+    leaders = select(leader.id).where(leader.status == status)
+    session.execute(
+        update(Task)
+        .where(Task.leader_task_id.in_(leaders), Task.status.in_(LEASED_STATUSES))
+        .values(status=status)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def recover_own_tasks(session, worker_id):
+    """При старте воркера возвращает в очередь задачи, которые он держал до перезапуска.
+
+    Аренды не ждём: прежний процесс с этим worker_id точно мёртв. Перезапуск —
+    не ошибка скачивания, поэтому попытка не засчитывается. Недокачанные
+    файлы остаются в рабочей папке задачи, и следующий захват продолжит с них.
+    """
+    result = session.execute(
+        update(Task)
+        .where(Task.worker_id == worker_id, Task.status.in_(LEASED_STATUSES), Task.leader_task_id.is_(None))
+        .values(
+            status=TaskStatus.queued,
+            worker_id=None,
+            lease_expires_at=None,
+            next_attempt_at=None,
+            attempts=case((Task.attempts > 0, Task.attempts - 1), else_=0),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    sync_followers_of_leaders_in(session, TaskStatus.queued)
+    session.commit()
+    return result.rowcount
+
+
+def reap_expired_leases(session):
+    """Возвращает в очередь задачи с истёкшей арендой. Возвращает их количество.
+
+    Задачи без аренды в рабочих статусах (остались от старого воркера)
+    тоже считаются брошенными. Задача, которая исчерпала MAX_ATTEMPTS
+    (например, каждый раз роняет воркер), уходит в dead_letter. Ведомые
+    задачи аренды не имеют — они следуют за своим лидером.
+    """
+    abandoned = (
+        Task.status.in_(LEASED_STATUSES),
+        Task.leader_task_id.is_(None),
+        or_(Task.lease_expires_at.is_(None), Task.lease_expires_at < utcnow()),
+    )
+    session.execute(
+        update(Task)
+        .where(*abandoned, Task.attempts >= MAX_ATTEMPTS)
+        .values(status=TaskStatus.dead_letter, worker_id=None, lease_expires_at=None, last_error="lease expired")
+        .execution_options(synchronize_session=False)
+    )
+    result = session.execute(
+        update(Task)
+        .where(*abandoned)
+        .values(status=TaskStatus.queued, worker_id=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    for status in (TaskStatus.queued, TaskStatus.dead_letter):
+        sync_followers_of_leaders_in(session, status)
+    session.commit()
+    return result.rowcount
+
+
+class LeaseKeeper(threading.Thread):
+    """Фоновый поток, который продлевает аренду, пока задача выполняется."""
+
+    def __init__(self, session_factory, task_id, worker_id, lease_seconds=LEASE_SECONDS):
+        super().__init__(daemon=True)
+        self.session_factory = session_factory
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.interval = max(lease_seconds / 3, 1)
+        self.lost = threading.Event()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                with self.session_factory() as session:
+                    if not renew_lease(session, self.task_id, self.worker_id, self.lease_seconds):
+                        print(f"Task {self.task_id}: lease lost")
+                        self.lost.set()
+                        return
+            except Exception as e:
+                # БД может моргнуть — попробуем ещё раз на следующем тике
+                print(f"Task {self.task_id}: lease renewal failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
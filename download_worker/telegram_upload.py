@@ -0,0 +1,75 @@
+# download_worker/telegram_upload.py
+#
+# Загрузка готовых файлов в Telegram прямо из воркера: файл уходит в служебный
+# чат (TELEGRAM_STORAGE_CHAT_ID), а бот потом рассылает пользователям уже по
+# file_id, не читая файл с общего тома.
+# Тело multipart собирается на лету: файл отображается в память (mmap) и
+# отдаётся кусками по UPLOAD_CHUNK_SIZE, так что память не растёт с размером файла.
+
+import mmap
+import os
+import uuid
+
+import requests
+
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", "600"))
+
+
+class MultipartFileBody:
+    """multipart/form-data с одним файлом, читаемым из mmap.
+
+    Длина известна заранее (__len__), поэтому requests отправляет
+    Content-Length, а не chunked — Bot API chunked-загрузку не принимает.
+    """
+
+    def __init__(self, fields, file_field, path):
+        self.boundary = uuid.uuid4().hex
+        self.path = path
+        self.size = os.path.getsize(path)
+        head = []
+        for name, value in fields.items():
+            head.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            )
+        head.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{os.path.basename(path)}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+        )
+        self.head = "".join(head).encode()
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self.head) + self.size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, self.size, UPLOAD_CHUNK_SIZE):
+                yield mm[offset:offset + UPLOAD_CHUNK_SIZE]
+        yield self.tail
+
+
+def send_document(token, chat_id, path, caption=None):
+    """Загружает файл через sendDocument и возвращает его file_id."""
+    fields = {"chat_id": chat_id, "disable_notification": "true"}
+    if caption:
+        fields["caption"] = caption
+    body = MultipartFileBody(fields, "document", path)
+    resp = requests.post(
+        f"{TELEGRAM_API_URL}/bot{token}/sendDocument",
+        data=body,
+        headers={"Content-Type": body.content_type},
+        timeout=(10, UPLOAD_TIMEOUT),
+    )
+    data = resp.json()
+    if not data.get("ok"):
+        raise RuntimeError(f"sendDocument failed: {data.get('description', resp.status_code)}")
+    message = data["result"]
+    media = message.get("document") or message.get("video") or message.get("animation")
+    return media["file_id"]